@@ -19,6 +19,9 @@
 */
 
 #include <uapi/linux/bpf_perf_event.h>
+#ifdef RAW_TRACEPOINTS
+#include <linux/sched.h>
+#endif
 
 /**
  * In the rest of the code we are going to use a selector to read and write
@@ -47,6 +50,7 @@ struct pid_status {
         int pid;                            /**< Process ID */
         int tgid;
         char comm[TASK_COMM_LEN];           /**< Process name */
+        u64 cgroup_id;                      /**< cgroup v2 id of the process (0 if unsupported) */
         u64 weighted_cycles[NUM_SLOTS];     /**< Number of weighted cycles executed by the process */
         u64 cycles[SELECTOR_DIM];              /**< Number of unhalted core cycles executed by the process */
         u64 instruction_retired[SELECTOR_DIM]; /**< Number of instructions executed by the process */
@@ -127,36 +131,72 @@ BPF_PERF_ARRAY(instr_thread, NUM_CPUS);
 BPF_PERF_ARRAY(cache_misses, NUM_CPUS);
 BPF_PERF_ARRAY(cache_refs, NUM_CPUS);
 #endif
-BPF_HASH(processors, u64, struct proc_topology);
+/**
+ * processors and idles are indexed by cpu id, arrays avoid hashing the key
+ * on every context switch. idles entries exist (zeroed) from the start,
+ * an empty comm marks the ones not initialized yet.
+ */
+BPF_ARRAY(processors, struct proc_topology, NUM_CPUS);
 BPF_HASH(pids, int, struct pid_status);
-BPF_HASH(idles, u64, struct pid_status);
+BPF_ARRAY(idles, struct pid_status, NUM_CPUS);
 
 /**
- * conf struct has 4 integer keys initialized in user space
+ * conf struct has 2 integer keys initialized in user space
  * 0: current bpf selector
- * 1: old bpf selector
- * 2: timeslice (dynamic window duration)
- * 3: switch count (global context switch counter). Used to compute the window size
+ * 1: timeslice (dynamic window duration)
  */
 #define BPF_SELECTOR_INDEX 0
-#define BPF_SELECTOR_INDEX_OLD 1
-#define BPF_TIMESLICE 2
-#define BPF_SWITCH_COUNT 3
-BPF_ARRAY(conf, u32, 4);
+#define BPF_TIMESLICE 1
+BPF_ARRAY(conf, u32, 2);
+
+/**
+ * Per cpu context switch counter, used to compute the window size.
+ * The counter restarts when the cpu sees a new selector, userspace sums the
+ * counts of the cpus tagged with the selector being read and updated within
+ * the last timeslice.
+ */
+struct switch_count {
+        u64 count;
+        u64 ts;
+        u32 bpf_selector;
+};
+BPF_PERCPU_ARRAY(switch_counts, struct switch_count, 1);
 
 /*
  * timestamp array to store the last timestamp of a given time slot
  */
 BPF_ARRAY(global_timestamps, u64, SELECTOR_DIM);
 
+/**
+ * Epoch handshake for the selector swap. Each cpu owns one cache line:
+ * bit 0 is set while a handler is running, the upper bits hold the last
+ * selector read by a handler on exit. After flipping the selector,
+ * userspace waits until every cpu is either not running a handler or has
+ * acknowledged the new selector, then the old slots can be read safely.
+ * When supported the array is mmapped by userspace, no syscall needed.
+ */
+struct cpu_epoch {
+        u64 state;
+        u64 pad[7];
+};
+#ifdef MMAPABLE_MAPS
+#ifndef BPF_F_MMAPABLE
+#define BPF_F_MMAPABLE (1U << 10)
+#endif
+BPF_F_TABLE("array", int, struct cpu_epoch, cpu_epochs, NUM_CPUS, BPF_F_MMAPABLE);
+#else
+BPF_ARRAY(cpu_epochs, struct cpu_epoch, NUM_CPUS);
+#endif
+
 
 /**
  * STEP_MIN and STEP_MAX are the lower and upper bound for the duration
  * of the dynamic window (interval between two reads from user space)
- * They are expressed in nanoseconds so their range is 1-4 second.
+ * They are expressed in nanoseconds so their range is 10 ms-4 seconds,
+ * the lower end is used by the high frequency sampling mode.
  * BEWARE: Changing the step in userspace means invalidate the last sample
  */
-#define STEP_MIN 1000000000
+#define STEP_MIN 10000000
 #define STEP_MAX 4000000000
 
 #define HAPPY_FACTOR 11/20
@@ -174,7 +214,7 @@ BPF_ARRAY(global_timestamps, u64, SELECTOR_DIM);
 #define THREAD_MIGRATED_UNEXPECTEDLY -7
 
 
-static void send_error(struct sched_switch_args *ctx, int err_code) {
+static void send_error(void *ctx, int err_code) {
 #ifdef DEBUG
         struct error_code error;
         error.err = err_code;
@@ -190,8 +230,26 @@ static void send_perf_error(struct bpf_perf_event_data *ctx, int err_code) {
 #endif
 }
 
+static inline void epoch_enter(int processor_id) {
+        struct cpu_epoch *epoch = cpu_epochs.lookup(&processor_id);
+        if (epoch) {
+                // atomic add is a full barrier: the busy bit is visible
+                // before the selector is read
+                __sync_fetch_and_add(&(epoch->state), 1);
+        }
+}
+
+static inline void epoch_exit(int processor_id) {
+        int selector_key = BPF_SELECTOR_INDEX;
+        u32 *bpf_selector = conf.lookup(&selector_key);
+        struct cpu_epoch *epoch = cpu_epochs.lookup(&processor_id);
+        if (epoch && bpf_selector) {
+                epoch->state = ((u64) *bpf_selector) << 1;
+        }
+}
+
 static inline int update_cycles_count(void *ctx,
-        int old_pid, u32 bpf_selector, u32 step, u64 processor_id,
+        int old_pid, u32 bpf_selector, u32 step, int processor_id,
 #ifdef PERFORMANCE_COUNTERS
         u64 thread_cycles_sample, u64 core_cycles_sample,
         u64 instruction_retired_thread, u64 cache_misses_thread,
@@ -209,26 +267,25 @@ static inline int update_cycles_count(void *ctx,
             return 0;
     }
 
-    // Create the struct to hold the pid status we are going to fetch
-    struct pid_status status_old;
-    status_old.pid = -1;
-
     /**
      * Fetch the status of the exiting pid.
-     * If the pid is 0 then use the idles perf_hash
+     * If the pid is 0 then use the idles array.
+     * The status is updated in place through the map value pointer, no
+     * copy of the struct is made and no concurrent update can be lost.
      */
+    struct pid_status *status_old;
     if(old_pid == 0) {
-            ret = bpf_probe_read(&status_old, sizeof(status_old), idles.lookup(&(processor_id)));
+            status_old = idles.lookup(&processor_id);
     } else {
-            ret = bpf_probe_read(&status_old, sizeof(status_old), pids.lookup(&(old_pid)));
+            status_old = pids.lookup(&old_pid);
     }
 
-    if(ret != 0) {
+    if(status_old == NULL) {
         // no data for this thread, for now do not account data
         return 0;
     }
 
-    if (topology_info.running_pid != status_old.pid) {
+    if (topology_info.running_pid != status_old->pid) {
         // we have some issues
         send_error(ctx, THREAD_MIGRATED_UNEXPECTEDLY);
         return 0;
@@ -236,7 +293,7 @@ static inline int update_cycles_count(void *ctx,
 
 #ifdef PERFORMANCE_COUNTERS
     // Retrieving information of the sibling processor
-    u64 sibling_id = topology_info.sibling_id;
+    int sibling_id = topology_info.sibling_id;
     struct proc_topology sibling_info;
     ret = bpf_probe_read(&sibling_info, sizeof(sibling_info), processors.lookup(&(sibling_id)));
 
@@ -267,8 +324,8 @@ static inline int update_cycles_count(void *ctx,
     //trick the compiler with loop unrolling
     #pragma clang loop unroll(full)
     for(int array_index = 0; array_index<SELECTOR_DIM; array_index++) {
-            if(array_index == status_old.bpf_selector) {
-                    last_ts_pid_in = status_old.ts[array_index];
+            if(array_index == status_old->bpf_selector) {
+                    last_ts_pid_in = status_old->ts[array_index];
             }
     }
 
@@ -277,14 +334,14 @@ static inline int update_cycles_count(void *ctx,
      * in the bpf_selector or current ts greater than the end of
      * the window) we need to update the selector and reset PCM counters
      */
-    if(status_old.bpf_selector != bpf_selector || last_ts_pid_in + step < ts) {
-            status_old.bpf_selector = bpf_selector;
+    if(status_old->bpf_selector != bpf_selector || last_ts_pid_in + step < ts) {
+            status_old->bpf_selector = bpf_selector;
 #ifdef PERFORMANCE_COUNTERS
             //trick the compiler with loop unrolling
             #pragma clang loop unroll(full)
             for(int array_index = 0; array_index<NUM_SLOTS; array_index++) {
                     if(array_index % SELECTOR_DIM == bpf_selector) {
-                            status_old.weighted_cycles[array_index] = 0;
+                            status_old->weighted_cycles[array_index] = 0;
                     }
             }
 #endif
@@ -292,12 +349,12 @@ static inline int update_cycles_count(void *ctx,
             for(int array_index = 0; array_index < SELECTOR_DIM; array_index++) {
                     if(array_index == bpf_selector) {
 #ifdef PERFORMANCE_COUNTERS
-                            status_old.cycles[array_index] = 0;
-                            status_old.instruction_retired[array_index] = 0;
-                            status_old.cache_misses[array_index] = 0;
-                            status_old.cache_refs[array_index] = 0;
+                            status_old->cycles[array_index] = 0;
+                            status_old->instruction_retired[array_index] = 0;
+                            status_old->cache_misses[array_index] = 0;
+                            status_old->cache_refs[array_index] = 0;
 #endif
-                            status_old.time_ns[array_index] = 0;
+                            status_old->time_ns[array_index] = 0;
                     }
             }
     }
@@ -328,31 +385,31 @@ static inline int update_cycles_count(void *ctx,
             // update per process measurements (aka IR, cache misses, cycles not weighted)
             #pragma clang loop unroll(full)
             for(int array_index = 0; array_index<SELECTOR_DIM; array_index++) {
-                    if(array_index == status_old.bpf_selector){
+                    if(array_index == status_old->bpf_selector){
 #ifdef PERFORMANCE_COUNTERS
                             if (instruction_retired_thread >= topology_info.instruction_thread) {
-                                    status_old.instruction_retired[array_index] += instruction_retired_thread - topology_info.instruction_thread;
+                                    status_old->instruction_retired[array_index] += instruction_retired_thread - topology_info.instruction_thread;
                             } else {
                                     send_error(ctx, old_pid);
                             }
                             if (cache_misses_thread >= topology_info.cache_misses) {
-                                    status_old.cache_misses[array_index] += cache_misses_thread - topology_info.cache_misses;
+                                    status_old->cache_misses[array_index] += cache_misses_thread - topology_info.cache_misses;
                             } else {
                                     send_error(ctx, old_pid);
                             }
                             if (cache_refs_thread >= topology_info.cache_refs) {
-                                    status_old.cache_refs[array_index] += cache_refs_thread - topology_info.cache_refs;
+                                    status_old->cache_refs[array_index] += cache_refs_thread - topology_info.cache_refs;
                             } else {
                                     send_error(ctx, old_pid);
                             }
                             if (thread_cycles_sample >= topology_info.cycles_thread){
-                                    status_old.cycles[array_index] += thread_cycles_sample - topology_info.cycles_thread;
+                                    status_old->cycles[array_index] += thread_cycles_sample - topology_info.cycles_thread;
                             } else {
                                     send_error(ctx, old_pid);
                             }
 #endif
-                            status_old.time_ns[array_index] += ts - topology_info.ts;
-                            status_old.ts[array_index] = ts;
+                            status_old->time_ns[array_index] += ts - topology_info.ts;
+                            status_old->ts[array_index] = ts;
                     }
             }
     }
@@ -363,13 +420,13 @@ static inline int update_cycles_count(void *ctx,
     if (topology_info.ts > 0) {
             #pragma clang loop unroll(full)
             for(int array_index = 0; array_index<NUM_SLOTS; array_index++) {
-                    if(array_index == status_old.bpf_selector + SELECTOR_DIM * topology_info.processor_id) {
+                    if(array_index == status_old->bpf_selector + SELECTOR_DIM * topology_info.processor_id) {
                             //discard sample if cycles counter did overflow
                             if (thread_cycles_sample > topology_info.cycles_thread){
                                     u64 cycle1 = thread_cycles_sample - topology_info.cycles_thread;
                                     u64 cycle_overlap = topology_info.cycles_core_delta_sibling;
                                     u64 cycle_non_overlap = cycle1 > topology_info.cycles_core_delta_sibling ? cycle1 - topology_info.cycles_core_delta_sibling : 0;
-                                    status_old.weighted_cycles[array_index] += cycle_non_overlap + cycle_overlap*HAPPY_FACTOR;
+                                    status_old->weighted_cycles[array_index] += cycle_non_overlap + cycle_overlap*HAPPY_FACTOR;
                             } else {
                                     send_error(ctx, old_pid);
                             }
@@ -377,25 +434,26 @@ static inline int update_cycles_count(void *ctx,
             }
     }
 #endif
-    // update the pid status in our hashmap
-    if(old_pid == 0) {
-            status_old.tgid = bpf_get_current_pid_tgid() >> 32;
-            idles.update(&processor_id, &status_old);
-    } else {
-            status_old.tgid = bpf_get_current_pid_tgid() >> 32;
-            pids.update(&old_pid, &status_old);
-    }
+    // complete the pid status, already stored in the map
+#ifdef CGROUP_ID
+    status_old->cgroup_id = bpf_get_current_cgroup_id();
+#endif
+    status_old->tgid = bpf_get_current_pid_tgid() >> 32;
 
     return 0;
 }
 
-int trace_switch(struct sched_switch_args *ctx) {
+/**
+ * Body of the sched_switch handlers. The classic tracepoint reads pids and
+ * comm from the tracepoint format struct, the raw tracepoint reads them
+ * from the prev/next task_structs, both end up here.
+ */
+static inline int handle_switch(void *ctx, int prev_pid, int new_pid, const char *next_comm) {
 
-        // Keys for the conf hash
+        // Keys for the conf array
         int selector_key = BPF_SELECTOR_INDEX;
-        int old_selector_key = BPF_SELECTOR_INDEX_OLD;
         int step_key = BPF_TIMESLICE;
-        int switch_count_key = BPF_SWITCH_COUNT;
+        int switch_count_key = 0;
 
         // Slot iterator for the selector
         int array_index = 0;
@@ -410,29 +468,21 @@ int trace_switch(struct sched_switch_args *ctx) {
                 return 0;
         }
 
-        // Retrieve general switch count
-        unsigned int switch_count = 0;
-        ret = 0;
-        ret = bpf_probe_read(&switch_count, sizeof(switch_count), conf.lookup(&switch_count_key));
-
         /**
-         * Retrieve old selector to update switch count correctly
+         * Update the switch count of this cpu.
          * If the current selector is still active increase the switch count
-         * otherwise reset the count and update the current selector
+         * otherwise reset the count and record the current selector
          */
-        unsigned int old_bpf_selector = 0;
-        ret = 0;
-        ret = bpf_probe_read(&old_bpf_selector, sizeof(old_bpf_selector), conf.lookup(&old_selector_key));
-        if (ret!= 0 || old_bpf_selector > 1) {
-                send_error(ctx, OLD_BPF_SELECTOR_NOT_IN_PLACE);
-                return 0;
-        } else if(old_bpf_selector != bpf_selector) {
-                switch_count = 1;
-                conf.update(&old_selector_key, &bpf_selector);
-        } else {
-                switch_count++;
+        struct switch_count *switch_count = switch_counts.lookup(&switch_count_key);
+        if (switch_count) {
+                if (switch_count->bpf_selector != bpf_selector) {
+                        switch_count->bpf_selector = bpf_selector;
+                        switch_count->count = 1;
+                } else {
+                        switch_count->count++;
+                }
+                switch_count->ts = bpf_ktime_get_ns();
         }
-        conf.update(&switch_count_key, &switch_count);
 
         /**
          * Retrieve sampling step (dynamic window)
@@ -456,7 +506,7 @@ int trace_switch(struct sched_switch_args *ctx) {
          * Collect cycles and IR samples from perf arrays.
          * Save the timestamp and store the exiting pid
          */
-        u64 processor_id = bpf_get_smp_processor_id();
+        int processor_id = bpf_get_smp_processor_id();
 #ifdef PERFORMANCE_COUNTERS
         u64 thread_cycles_sample = cycles_thread.perf_read(processor_id);
         u64 core_cycles_sample = cycles_core.perf_read(processor_id);
@@ -465,7 +515,7 @@ int trace_switch(struct sched_switch_args *ctx) {
         u64 cache_refs_thread = cache_refs.perf_read(processor_id);
 #endif
         u64 ts = bpf_ktime_get_ns();
-        int current_pid = ctx->prev_pid;
+        int current_pid = prev_pid;
 
         if (ret == 0) {
 #ifdef PERFORMANCE_COUNTERS
@@ -487,39 +537,29 @@ int trace_switch(struct sched_switch_args *ctx) {
         //
         // handle new scheduled process
         //
-        int new_pid = ctx->next_pid;
-        struct pid_status status_new;
         if(new_pid == 0) {
-                ret = bpf_probe_read(&status_new, sizeof(status_new), idles.lookup(&(processor_id)));
-        } else {
-                ret = bpf_probe_read(&status_new, sizeof(status_new), pids.lookup(&(new_pid)));
-        }
-        //If no status for PID, then create one, otherwise update selector
-        if(ret) {
-                bpf_probe_read(&(status_new.comm), sizeof(status_new.comm), ctx->next_comm);
-
-                #pragma clang loop unroll(full)
-                for(array_index = 0; array_index<NUM_SLOTS; array_index++) {
-                        status_new.weighted_cycles[array_index] = 0;
+                // idle entries always exist, initialize them in place once
+                struct pid_status *idle_status = idles.lookup(&processor_id);
+                if(idle_status && idle_status->comm[0] == 0) {
+                        bpf_probe_read(&(idle_status->comm), sizeof(idle_status->comm), next_comm);
+                        #pragma clang loop unroll(full)
+                        for(array_index = 0; array_index<SELECTOR_DIM; array_index++) {
+                                idle_status->ts[array_index] = ts;
+                        }
+                        idle_status->bpf_selector = bpf_selector;
                 }
+        } else if(pids.lookup(&new_pid) == NULL) {
+                //If no status for PID, then create one
+                struct pid_status status_new = {};
+                bpf_probe_read(&(status_new.comm), sizeof(status_new.comm), next_comm);
                 #pragma clang loop unroll(full)
                 for(array_index = 0; array_index<SELECTOR_DIM; array_index++) {
                         status_new.ts[array_index] = ts;
-                        status_new.time_ns[array_index] = 0;
-#ifdef PERFORMANCE_COUNTERS
-                        status_new.cycles[array_index] = 0;
-                        status_new.instruction_retired[array_index] = 0;
-                        status_new.cache_misses[array_index] = 0;
-                        status_new.cache_refs[array_index] = 0;
-#endif
                 }
                 status_new.pid = new_pid;
                 status_new.bpf_selector = bpf_selector;
-                if(new_pid == 0) {
-                        idles.insert(&processor_id, &status_new);
-                } else {
-                        pids.insert(&new_pid, &status_new);
-                }
+                // BPF_NOEXIST, never overwrite a status inserted meanwhile
+                pids.insert(&new_pid, &status_new);
         }
         //add info on new running pid into processors table
         topology_info.running_pid = new_pid;
@@ -540,7 +580,41 @@ int trace_switch(struct sched_switch_args *ctx) {
 
 }
 
-int trace_exit(struct sched_process_exit_args *ctx) {
+int trace_switch(struct sched_switch_args *ctx) {
+        int processor_id = bpf_get_smp_processor_id();
+        epoch_enter(processor_id);
+        handle_switch(ctx, ctx->prev_pid, ctx->next_pid, ctx->next_comm);
+        epoch_exit(processor_id);
+        return 0;
+}
+
+#ifdef RAW_TRACEPOINTS
+/**
+ * Raw tracepoint version of trace_switch, attached explicitly from
+ * userspace. TP_PROTO(bool preempt, struct task_struct *prev,
+ * struct task_struct *next, ...)
+ */
+int raw_trace_switch(struct bpf_raw_tracepoint_args *ctx) {
+        struct task_struct *prev = (struct task_struct *)ctx->args[1];
+        struct task_struct *next = (struct task_struct *)ctx->args[2];
+        int prev_pid = 0;
+        int next_pid = 0;
+        char next_comm[TASK_COMM_LEN] = {};
+        bpf_probe_read(&prev_pid, sizeof(prev_pid), &(prev->pid));
+        bpf_probe_read(&next_pid, sizeof(next_pid), &(next->pid));
+        bpf_probe_read(&next_comm, sizeof(next_comm), &(next->comm));
+        int processor_id = bpf_get_smp_processor_id();
+        epoch_enter(processor_id);
+        handle_switch(ctx, prev_pid, next_pid, next_comm);
+        epoch_exit(processor_id);
+        return 0;
+}
+#endif
+
+/**
+ * Body of the sched_process_exit handlers
+ */
+static inline int handle_exit(void *ctx, int pid) {
 
         // // Keys for the conf hash
         // int selector_key = BPF_SELECTOR_INDEX;
@@ -566,11 +640,8 @@ int trace_exit(struct sched_process_exit_args *ctx) {
         //         return 0;
         // }
 
-        char comm[16];
-        bpf_probe_read(&(comm), sizeof(comm), ctx->comm);
-        int pid = ctx->pid;
         u64 ts = bpf_ktime_get_ns();
-        u64 processor_id = bpf_get_smp_processor_id();
+        int processor_id = bpf_get_smp_processor_id();
 
         //
         // // if (ret==0) {
@@ -673,13 +744,28 @@ int trace_exit(struct sched_process_exit_args *ctx) {
         return 0;
 }
 
-int timed_trace(struct bpf_perf_event_data *perf_ctx) {
+int trace_exit(struct sched_process_exit_args *ctx) {
+        return handle_exit(ctx, ctx->pid);
+}
+
+#ifdef RAW_TRACEPOINTS
+/**
+ * Raw tracepoint version of trace_exit. TP_PROTO(struct task_struct *p, ...)
+ */
+int raw_trace_exit(struct bpf_raw_tracepoint_args *ctx) {
+        struct task_struct *p = (struct task_struct *)ctx->args[0];
+        int pid = 0;
+        bpf_probe_read(&pid, sizeof(pid), &(p->pid));
+        return handle_exit(ctx, pid);
+}
+#endif
 
-        // Keys for the conf hash
+static inline int handle_timed(struct bpf_perf_event_data *perf_ctx) {
+
+        // Keys for the conf array
         int selector_key = BPF_SELECTOR_INDEX;
-        int old_selector_key = BPF_SELECTOR_INDEX_OLD;
         int step_key = BPF_TIMESLICE;
-        int switch_count_key = BPF_SWITCH_COUNT;
+        int switch_count_key = 0;
 
         // Slot iterator for the selector
         int array_index = 0;
@@ -695,24 +781,14 @@ int timed_trace(struct bpf_perf_event_data *perf_ctx) {
         }
 
 
-        // Retrieve general switch count
-        unsigned int switch_count = 0;
-        ret = 0;
-        ret = bpf_probe_read(&switch_count, sizeof(switch_count), conf.lookup(&switch_count_key));
-
         /**
-         * Retrieve old selector to update switch count correctly
+         * Restart the switch count of this cpu on a new selector
          */
-        unsigned int old_bpf_selector = 0;
-        ret = 0;
-        ret = bpf_probe_read(&old_bpf_selector, sizeof(old_bpf_selector), conf.lookup(&old_selector_key));
-        if (ret!= 0 || old_bpf_selector > 1) {
-                send_perf_error(perf_ctx, OLD_BPF_SELECTOR_NOT_IN_PLACE);
-                return 0;
-        } else if(old_bpf_selector != bpf_selector) {
-                switch_count = 1;
-                conf.update(&switch_count_key, &switch_count);
-                conf.update(&old_selector_key, &bpf_selector);
+        struct switch_count *switch_count = switch_counts.lookup(&switch_count_key);
+        if (switch_count && switch_count->bpf_selector != bpf_selector) {
+                switch_count->bpf_selector = bpf_selector;
+                switch_count->count = 1;
+                switch_count->ts = bpf_ktime_get_ns();
         }
 
         /**
@@ -737,7 +813,7 @@ int timed_trace(struct bpf_perf_event_data *perf_ctx) {
         /* Read the values of the performance counters to update the data
          * inside our hashmap
          */
-        u64 processor_id = bpf_get_smp_processor_id();
+        int processor_id = bpf_get_smp_processor_id();
 #ifdef PERFORMANCE_COUNTERS
         u64 thread_cycles_sample = cycles_thread.perf_read(processor_id);
         u64 core_cycles_sample = cycles_core.perf_read(processor_id);
@@ -784,3 +860,11 @@ int timed_trace(struct bpf_perf_event_data *perf_ctx) {
 
         return 0;
 }
+
+int timed_trace(struct bpf_perf_event_data *perf_ctx) {
+        int processor_id = bpf_get_smp_processor_id();
+        epoch_enter(processor_id);
+        handle_timed(perf_ctx);
+        epoch_exit(processor_id);
+        return 0;
+}
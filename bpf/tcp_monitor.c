@@ -132,6 +132,7 @@ struct summary_data_t {
   u64 byte_tx;
   u64 byte_rx;
   u64 time;
+  u64 cgroup_id; // cgroup v2 id of the task that closed the transaction
   int16_t status;
 };
 
@@ -436,6 +437,9 @@ TRACEPOINT_PROBE(sock, inet_sock_set_state) {
               summary_data.byte_rx += connection_data->byte_rx;
               summary_data.byte_tx += connection_data->byte_tx;
               summary_data.pid = bpf_get_current_pid_tgid();
+#ifdef CGROUP_ID
+              summary_data.cgroup_id = bpf_get_current_cgroup_id();
+#endif
 
               if(selector_value == BPF_SELECTOR_ONE) {
                 ipv4_http_summary_1.update(&http_key, &summary_data);
@@ -632,6 +636,9 @@ TRACEPOINT_PROBE(sock, inet_sock_set_state) {
               summary_data.byte_rx += connection_data->byte_rx;
               summary_data.byte_tx += connection_data->byte_tx;
               summary_data.pid = bpf_get_current_pid_tgid();
+#ifdef CGROUP_ID
+              summary_data.cgroup_id = bpf_get_current_cgroup_id();
+#endif
 
               if(selector_value == BPF_SELECTOR_ONE) {
                 ipv4_summary_1.update(&connection_key, &summary_data);
@@ -946,6 +953,9 @@ TRACEPOINT_PROBE(sock, inet_sock_set_state) {
               summary_data.byte_rx += connection_data->byte_rx;
               summary_data.byte_tx += connection_data->byte_tx;
               summary_data.pid = bpf_get_current_pid_tgid();
+#ifdef CGROUP_ID
+              summary_data.cgroup_id = bpf_get_current_cgroup_id();
+#endif
 
               if(selector_value == BPF_SELECTOR_ONE) {
                 ipv6_http_summary_1.update(&http_key, &summary_data);
@@ -1142,6 +1152,9 @@ TRACEPOINT_PROBE(sock, inet_sock_set_state) {
               summary_data.byte_rx += connection_data->byte_rx;
               summary_data.byte_tx += connection_data->byte_tx;
               summary_data.pid = bpf_get_current_pid_tgid();
+#ifdef CGROUP_ID
+              summary_data.cgroup_id = bpf_get_current_cgroup_id();
+#endif
 
               if(selector_value == BPF_SELECTOR_ONE) {
                 ipv6_summary_1.update(&connection_key, &summary_data);
@@ -1413,6 +1426,9 @@ int kprobe__tcp_sendmsg(struct pt_regs *ctx, struct sock *sk, struct msghdr *msg
               summary_data.byte_tx += connection_data->byte_tx;
               summary_data.status = STATUS_CLIENT;
               summary_data.pid = bpf_get_current_pid_tgid();
+#ifdef CGROUP_ID
+              summary_data.cgroup_id = bpf_get_current_cgroup_id();
+#endif
 
               if(selector_value == BPF_SELECTOR_ONE) {
                 ipv4_http_summary_1.update(&http_key, &summary_data);
@@ -1525,6 +1541,9 @@ int kprobe__tcp_sendmsg(struct pt_regs *ctx, struct sock *sk, struct msghdr *msg
               summary_data.byte_tx += connection_data->byte_tx;
               summary_data.status = STATUS_CLIENT;
               summary_data.pid = bpf_get_current_pid_tgid();
+#ifdef CGROUP_ID
+              summary_data.cgroup_id = bpf_get_current_cgroup_id();
+#endif
 
               if(selector_value == BPF_SELECTOR_ONE) {
                 ipv4_summary_1.update(&connection_key, &summary_data);
@@ -1786,6 +1805,9 @@ int kprobe__tcp_sendmsg(struct pt_regs *ctx, struct sock *sk, struct msghdr *msg
               summary_data.byte_tx += connection_data->byte_tx;
               summary_data.status = STATUS_CLIENT;
               summary_data.pid = bpf_get_current_pid_tgid();
+#ifdef CGROUP_ID
+              summary_data.cgroup_id = bpf_get_current_cgroup_id();
+#endif
 
               if(selector_value == BPF_SELECTOR_ONE) {
                 ipv6_http_summary_1.update(&http_key, &summary_data);
@@ -1899,6 +1921,9 @@ int kprobe__tcp_sendmsg(struct pt_regs *ctx, struct sock *sk, struct msghdr *msg
               summary_data.byte_tx += connection_data->byte_tx;
               summary_data.status = STATUS_CLIENT;
               summary_data.pid = bpf_get_current_pid_tgid();
+#ifdef CGROUP_ID
+              summary_data.cgroup_id = bpf_get_current_cgroup_id();
+#endif
 
               if(selector_value == BPF_SELECTOR_ONE) {
                 ipv6_summary_1.update(&connection_key, &summary_data);
@@ -2176,6 +2201,9 @@ int kprobe__tcp_cleanup_rbuf(struct pt_regs *ctx, struct sock *sk, int copied) {
               summary_data.byte_tx += connection_data->byte_tx;
               summary_data.status = STATUS_SERVER;
               summary_data.pid = bpf_get_current_pid_tgid();
+#ifdef CGROUP_ID
+              summary_data.cgroup_id = bpf_get_current_cgroup_id();
+#endif
 
               if(selector_value == BPF_SELECTOR_ONE) {
                 ipv4_http_summary_1.update(&http_key, &summary_data);
@@ -2286,6 +2314,9 @@ int kprobe__tcp_cleanup_rbuf(struct pt_regs *ctx, struct sock *sk, int copied) {
               summary_data.byte_tx += connection_data->byte_tx;
               summary_data.status = STATUS_SERVER;
               summary_data.pid = pid;
+#ifdef CGROUP_ID
+              summary_data.cgroup_id = bpf_get_current_cgroup_id();
+#endif
 
               if(selector_value == BPF_SELECTOR_ONE) {
                 ipv4_summary_1.update(&connection_key, &summary_data);
@@ -2550,6 +2581,9 @@ int kprobe__tcp_cleanup_rbuf(struct pt_regs *ctx, struct sock *sk, int copied) {
               summary_data.byte_tx += connection_data->byte_tx;
               summary_data.status = STATUS_SERVER;
               summary_data.pid = pid;
+#ifdef CGROUP_ID
+              summary_data.cgroup_id = bpf_get_current_cgroup_id();
+#endif
 
               if(selector_value == BPF_SELECTOR_ONE) {
                 ipv6_http_summary_1.update(&http_key, &summary_data);
@@ -2658,6 +2692,9 @@ int kprobe__tcp_cleanup_rbuf(struct pt_regs *ctx, struct sock *sk, int copied) {
               summary_data.byte_tx += connection_data->byte_tx;
               summary_data.status = STATUS_SERVER;
               summary_data.pid = bpf_get_current_pid_tgid();
+#ifdef CGROUP_ID
+              summary_data.cgroup_id = bpf_get_current_cgroup_id();
+#endif
 
               if(selector_value == BPF_SELECTOR_ONE) {
                 ipv6_summary_1.update(&connection_key, &summary_data);
@@ -37,6 +37,7 @@ struct val_t {
 
 struct val_pid_t {
     u32 pid;
+    u64 cgroup_id;
     u64 num_r;
     u64 num_w;
     u64 bytes_r;
@@ -119,6 +120,9 @@ static int trace_rw_return(struct pt_regs *ctx, int type) {
         }
         val_pid->sum_ts_deltas += delta_us;
         val_pid->pid = pid;
+#ifdef CGROUP_ID
+        val_pid->cgroup_id = bpf_get_current_cgroup_id();
+#endif
     }
 
     struct key_file_t file_key = {};
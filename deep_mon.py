@@ -60,6 +60,27 @@ CONTEXT_SETTINGS = dict(default_map=config)
 @click.option("--memory_measure", default="True")
 @click.option("--disk_measure", default="True")
 @click.option("--file_measure", default="True")
+@click.option("--eviction_timeout", default=30, type=float)
+@click.option(
+    "--tracepoint_mode", default="auto", type=click.Choice(["auto", "raw", "classic"])
+)
+@click.option("--frequency", "-f", default=1, type=float)
+@click.option("--export_queue_size", default=16, type=int)
+@click.option(
+    "--export_drop_policy",
+    default="drop_oldest",
+    type=click.Choice(["drop_oldest", "block"]),
+)
+@click.option("--series_grace_period", default=60, type=float)
+@click.option("--max_series", default=15000, type=int)
+@click.option("--parquet_roll_interval", default=3600, type=float)
+@click.option("--parquet_max_rows", default=1000000, type=int)
+@click.option("--store_retention", default=300, type=float)
+@click.option("--query_port", default=0, type=int)
+@click.option("--rollup_tiers", default="")
+@click.option(
+    "--memory_mode", default="cgroup", type=click.Choice(["cgroup", "pss", "process"])
+)
 def main(
     container_regex,
     window_mode,
@@ -73,7 +94,27 @@ def main(
     memory_measure,
     disk_measure,
     file_measure,
+    eviction_timeout,
+    tracepoint_mode,
+    frequency,
+    export_queue_size,
+    export_drop_policy,
+    series_grace_period,
+    max_series,
+    parquet_roll_interval,
+    parquet_max_rows,
+    store_retention,
+    query_port,
+    rollup_tiers,
+    memory_mode,
 ):
+    # ndjson owns stdout, the json output would interleave with its records
+    output_formats = [name.strip() for name in str(output_format).split(",")]
+    if "json" in output_formats and "ndjson" in output_formats:
+        raise click.BadParameter(
+            "json and ndjson cannot be enabled together", param_hint="--output-format"
+        )
+
     monitor = MonitorMain(
         container_regex,
         window_mode,
@@ -87,6 +128,19 @@ def main(
         memory_measure,
         disk_measure,
         file_measure,
+        eviction_timeout,
+        tracepoint_mode,
+        frequency,
+        export_queue_size,
+        export_drop_policy,
+        series_grace_period,
+        max_series,
+        parquet_roll_interval,
+        parquet_max_rows,
+        store_retention,
+        query_port,
+        rollup_tiers,
+        memory_mode,
     )
 
     monitor.monitor_loop()
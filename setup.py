@@ -34,6 +34,10 @@ setup(
     install_requires=[
         "Click",
     ],
+    extras_require={
+        "parquet": ["pyarrow"],
+        "ndjson": ["orjson"],
+    },
     entry_points="""
         [console_scripts]
         deep-mon=deep_mon.deep_mon:main
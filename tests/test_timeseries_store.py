@@ -0,0 +1,76 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import random
+
+from userspace.csv_writer import CONTAINER_FIELDS
+from userspace.csv_writer import FLOAT_FIELDS
+from userspace.timeseries_store import CHUNK_POINTS
+from userspace.timeseries_store import _Chunk
+from userspace.timeseries_store import _unzigzag
+from userspace.timeseries_store import _zigzag
+
+
+def _random_row(rng):
+    row = []
+    for field in CONTAINER_FIELDS:
+        if field in FLOAT_FIELDS:
+            row.append(rng.choice([0.0, 1.5, -2.25, rng.uniform(-1e6, 1e6), 1e-300]))
+        else:
+            row.append(
+                rng.choice([None, 0, 1, rng.randrange(2**40), -rng.randrange(2**20)])
+            )
+    return row
+
+
+def test_zigzag_round_trip():
+    for value in [0, 1, -1, 63, -64, 2**40, -(2**40)]:
+        assert _unzigzag(_zigzag(value)) == value
+
+
+def test_chunk_round_trip():
+    rng = random.Random(42)
+    chunk = _Chunk()
+    timestamps = []
+    rows = []
+    ts = 1700000000000
+    for _ in range(CHUNK_POINTS):
+        # irregular intervals, including gaps and repeated deltas
+        ts += rng.choice([1000, 1000, 999, 1001, 5000, 1])
+        row = _random_row(rng)
+        chunk.add(ts, row)
+        timestamps.append(ts)
+        rows.append(row)
+
+    assert chunk.is_full()
+    assert chunk.get_timestamps() == timestamps
+    for column, field in enumerate(CONTAINER_FIELDS):
+        assert chunk.get_values(field) == [row[column] for row in rows], field
+
+
+def test_steady_floats_are_compressed():
+    chunk = _Chunk()
+    row = [0.5 if field in FLOAT_FIELDS else 7 for field in CONTAINER_FIELDS]
+    for index in range(CHUNK_POINTS):
+        chunk.add(1000 * index, row)
+
+    for field in FLOAT_FIELDS:
+        assert chunk.columns[field].get_size() < CHUNK_POINTS // 4
+        assert chunk.get_values(field) == [0.5] * CHUNK_POINTS
@@ -23,18 +23,32 @@ from .proc_topology import BpfProcTopology
 from .proc_topology import ProcTopology
 from .process_info import BpfPidStatus
 from .process_info import SocketProcessItem
-from .process_table import ProcTable
 from .process_info import ProcessInfo
+from .cgroup_cache import CgroupCache
+from .cgroup_cache import kernel_supports_cgroup_id
+from .bpf_snapshot import BpfTableSnapshot
+from .bpf_snapshot import BpfArrayMapping
+from .bpf_snapshot import kernel_supports_mmapable_maps
 from .sample_controller import SampleController
 import ctypes as ct
 import json
+import numpy as np
 import traceback
 import multiprocessing
 import os
 import time
+import sys
 
 
 class BpfSample:
+    """
+    Result of a sampling interval.
+
+    Per process metrics are kept as NumPy columns, one row per process
+    active in the interval. ProcessInfo objects are built, and containers
+    resolved, only for the rows that are actually requested.
+    """
+
     def __init__(
         self,
         max_ts,
@@ -44,6 +58,11 @@ class BpfSample:
         total_active_power,
         pid_dict,
         cpu_cores,
+        columns=None,
+        container_cache=None,
+        late_cpus=0,
+        wall_time=None,
+        interval=None,
     ):
         self.max_ts = max_ts
         self.total_execution_time = total_time
@@ -52,6 +71,16 @@ class BpfSample:
         self.total_active_power = total_active_power
         self.pid_dict = pid_dict
         self.cpu_cores = cpu_cores
+        self.columns = columns
+        self.container_cache = container_cache
+        self.row_index = None
+        # cpus that did not acknowledge the selector swap in time
+        self.late_cpus = late_cpus
+        # wall clock time at the end of the sampled interval
+        self.wall_time = wall_time if wall_time is not None else time.time()
+        # measured length of the interval in seconds, the one power is
+        # averaged over. It differs from timeslice when ticks are coalesced
+        self.interval = interval
 
     def get_max_ts(self):
         return self.max_ts
@@ -65,18 +94,77 @@ class BpfSample:
     def get_timeslice(self):
         return self.timeslice
 
+    def get_wall_time(self):
+        return self.wall_time
+
+    def get_interval(self):
+        return self.interval
+
     def get_total_active_power(self):
         return self.total_active_power
 
     def get_pid_dict(self):
+        if self.pid_dict is None:
+            self.pid_dict = {}
+            for row, key in enumerate(self.columns["key"].tolist()):
+                self.pid_dict[key] = self._build_process_info(row)
         return self.pid_dict
 
+    def get_columns(self):
+        return self.columns
+
+    def get_keys(self):
+        if self.pid_dict is not None:
+            return list(self.pid_dict.keys())
+        return self.columns["key"].tolist()
+
+    def get_process_info(self, key):
+        if self.pid_dict is not None:
+            return self.pid_dict.get(key)
+        if self.row_index is None:
+            self.row_index = {
+                k: row for row, k in enumerate(self.columns["key"].tolist())
+            }
+        row = self.row_index.get(key)
+        if row is None:
+            return None
+        return self._build_process_info(row)
+
+    def _build_process_info(self, row):
+        columns = self.columns
+        weighted_cycles = columns["weighted_cycles"][row]
+        proc_info = ProcessInfo(len(weighted_cycles))
+        proc_info.set_pid(int(columns["pid"][row]))
+        proc_info.set_tgid(int(columns["tgid"][row]))
+        proc_info.set_comm(bytes(columns["comm"][row]))
+        proc_info.set_cycles(int(columns["cycles"][row]))
+        proc_info.set_instruction_retired(int(columns["instruction_retired"][row]))
+        proc_info.set_cache_misses(int(columns["cache_misses"][row]))
+        proc_info.set_cache_refs(int(columns["cache_refs"][row]))
+        proc_info.set_time_ns(int(columns["time_ns"][row]))
+        proc_info.set_power(columns["power"][row])
+        proc_info.set_cpu_usage(columns["cpu_usage"][row])
+        ts = int(columns["ts"][row])
+        for socket, cycles in enumerate(weighted_cycles.tolist()):
+            proc_info.set_socket_data(socket, SocketProcessItem(cycles, ts))
+
+        container_id = self.container_cache.get_container_id(
+            proc_info.get_pid(), proc_info.get_tgid(), int(columns["cgroup_id"][row])
+        )
+        if container_id is not None:
+            proc_info.set_cgroup_id(container_id)
+            proc_info.set_container_id(container_id[0:12])
+        return proc_info
+
     def get_cpu_cores(self):
         return self.cpu_cores
 
+    def get_late_cpus(self):
+        return self.late_cpus
+
     def __str__(self):
         str_representation = ""
-        for key, value in sorted(self.pid_dict.items()):
+        for key, value in sorted(self.get_pid_dict().items()):
             str_representation = str_representation + str(value) + "\n"
         str_representation = str_representation + self.get_log_line()
         return str_representation
@@ -90,6 +178,7 @@ class BpfSample:
             self.total_active_power["package"]
         )
         d["TOTAL CORE ACTIVE POWER"] = "{:.3f}".format(self.total_active_power["core"])
+        d["LATE CPUS"] = str(self.late_cpus)
         # d["TOTAL DRAM ACTIVE POWER"] = "{:.3f}".format(self.total_active_power["dram"])
         return d
 
@@ -147,24 +236,53 @@ class BPFErrors:
 
 
 class BpfCollector:
-    def __init__(self, topology, debug, power_measure):
+    def __init__(
+        self,
+        topology,
+        debug,
+        power_measure,
+        container_cache=None,
+        tracepoint_mode="auto",
+        epoch_timeout=0.01,
+    ):
         self.topology = topology
         self.debug = debug
         self.power_measure = power_measure
+        # auto: raw tracepoints when supported, classic ones otherwise
+        self.tracepoint_mode = tracepoint_mode
+        self.raw_tracepoints = False
+        # max time to wait for all the cpus to leave the old selector
+        self.epoch_timeout = epoch_timeout
+        # monotonic time of the previous sample
+        self.last_sample_time = None
+        self.container_cache = container_cache
+        if self.container_cache is None:
+            self.container_cache = CgroupCache()
         bpf_code_path = (
             os.path.dirname(os.path.abspath(__file__)) + "/../bpf/bpf_monitor.c"
         )
+        cflags = [
+            "-DNUM_CPUS=%d" % multiprocessing.cpu_count(),
+            "-DNUM_SOCKETS=%d" % len(self.topology.get_sockets()),
+            "-DPERFORMANCE_COUNTERS",
+            "-DDEBUG",
+        ]
+        if kernel_supports_cgroup_id():
+            cflags.append("-DCGROUP_ID")
+        if kernel_supports_mmapable_maps():
+            cflags.append("-DMMAPABLE_MAPS")
+        if self.tracepoint_mode != "classic":
+            if BPF.support_raw_tracepoint():
+                cflags.append("-DRAW_TRACEPOINTS")
+            elif self.tracepoint_mode == "raw":
+                print(
+                    "Raw tracepoints not supported, using classic tracepoints",
+                    file=sys.stderr,
+                )
         # if debug is False:
         # if self.power_measure == True:
-        self.bpf_program = BPF(
-            src_file=bpf_code_path,
-            cflags=[
-                "-DNUM_CPUS=%d" % multiprocessing.cpu_count(),
-                "-DNUM_SOCKETS=%d" % len(self.topology.get_sockets()),
-                "-DPERFORMANCE_COUNTERS",
-                "-DDEBUG",
-            ],
-        )
+        self.cflags = cflags
+        self.bpf_program = BPF(src_file=bpf_code_path, cflags=cflags)
         # print("Available BPF tables:", list(self.bpf_program.tables.keys()))
         # else:
         #     self.bpf_program = BPF(
@@ -181,6 +299,23 @@ class BpfCollector:
         self.idles = self.bpf_program.get_table("idles")
         self.bpf_config = self.bpf_program.get_table("conf")
         self.bpf_global_timestamps = self.bpf_program.get_table("global_timestamps")
+        self.switch_counts = self.bpf_program.get_table("switch_counts")
+        self.cpu_epochs = self.bpf_program.get_table("cpu_epochs")
+        self.epochs_mapping = None
+        self.epochs_snapshot = None
+        if "-DMMAPABLE_MAPS" in cflags:
+            try:
+                self.epochs_mapping = BpfArrayMapping(self.cpu_epochs)
+            except (OSError, ValueError) as e:
+                print(
+                    f"Error mapping cpu_epochs, reading it with syscalls: {e}",
+                    file=sys.stderr,
+                )
+        if self.epochs_mapping is None:
+            self.epochs_snapshot = BpfTableSnapshot(self.cpu_epochs)
+        # buffers the pids/idles maps are copied into once per sample
+        self.pids_snapshot = BpfTableSnapshot(self.pids)
+        self.idles_snapshot = BpfTableSnapshot(self.idles)
         self.selector = 0
         self.SELECTOR_DIM = 2
         self.timeslice = 1000000000
@@ -211,7 +346,7 @@ class BpfCollector:
             )
             # print("cycles_core opened successfully.")
         except Exception as e:
-            print(f"Error opening cycles_core: {e}")
+            print(f"Error opening cycles_core: {e}", file=sys.stderr)
             traceback.print_exc()
 
         try:
@@ -222,7 +357,7 @@ class BpfCollector:
             )
             # print("cycles_thread opened successfully.")
         except Exception as e:
-            print(f"Error opening cycles_thread: {e}")
+            print(f"Error opening cycles_thread: {e}", file=sys.stderr)
 
         try:
             # print("Opening instr_thread perf event...")
@@ -232,7 +367,7 @@ class BpfCollector:
             )
             # print("instr_thread opened successfully.")
         except Exception as e:
-            print(f"Error opening instr_thread: {e}")
+            print(f"Error opening instr_thread: {e}", file=sys.stderr)
 
         try:
             # print("Opening cache_misses perf event...")
@@ -241,7 +376,7 @@ class BpfCollector:
             )
             # print("cache_misses opened successfully.")
         except Exception as e:
-            print(f"Error opening cache_misses: {e}")
+            print(f"Error opening cache_misses: {e}", file=sys.stderr)
 
         try:
             # print("Opening cache_refs perf event...")
@@ -250,7 +385,7 @@ class BpfCollector:
             )
             # print("cache_refs opened successfully.")
         except Exception as e:
-            print(f"Error opening cache_refs: {e}")
+            print(f"Error opening cache_refs: {e}", file=sys.stderr)
 
     def print_event(self, cpu, data, size):
         event = ct.cast(data, ct.POINTER(ErrorCode)).contents
@@ -259,38 +394,36 @@ class BpfCollector:
                 "core: "
                 + str(cpu)
                 + " topology counters overflow or initialized with pid: "
-                + str(event.err)
+                + str(event.err),
+                file=sys.stderr,
             )
         elif event.err < -1:
             # exclude the BPF_PROCEED_WITH_DEBUG_MODE event, since it is used
             # just to advance computation for the timed capture
-            print("core: " + str(cpu) + " " + str(BPFErrors.error_dict[event.err]))
+            print(
+                "core: " + str(cpu) + " " + str(BPFErrors.error_dict[event.err]),
+                file=sys.stderr,
+            )
 
     def start_capture(self, timeslice):
         for key, value in self.topology.get_new_bpf_topology().items():
-            self.processors[ct.c_ulonglong(key)] = value
+            self.processors[ct.c_int(key)] = value
 
         self.timed_capture = False
         self.timeslice = timeslice
         self.bpf_config[ct.c_int(0)] = ct.c_uint(self.selector)  # current selector
-        self.bpf_config[ct.c_int(1)] = ct.c_uint(self.selector)  # old selector
-        self.bpf_config[ct.c_int(2)] = ct.c_uint(self.timeslice)  # timeslice
-        self.bpf_config[ct.c_int(3)] = ct.c_uint(0)  # switch count
+        self.bpf_config[ct.c_int(1)] = ct.c_uint(self.timeslice)  # timeslice
 
         if self.debug == True:
             self.bpf_program["err"].open_perf_buffer(self.print_event, page_cnt=256)
 
-        self.bpf_program.attach_tracepoint(
-            tp="sched:sched_switch", fn_name="trace_switch"
-        )
-        self.bpf_program.attach_tracepoint(
-            tp="sched:sched_process_exit", fn_name="trace_exit"
-        )
+        self._attach_sched_tracepoints()
 
     def start_timed_capture(self, count=0, frequency=0):
-        MIN_TIMESLICE_NS = 100_000_000
+        # must not be lower than STEP_MIN in bpf_monitor.c
+        MIN_TIMESLICE_NS = 10_000_000
         if frequency:
-            sample_freq = frequency
+            sample_freq = max(1, int(round(frequency)))
             sample_period = 0
             self.timeslice = max(
                 int((1 / float(frequency)) * 1000000000), MIN_TIMESLICE_NS
@@ -308,22 +441,15 @@ class BpfCollector:
         self.timed_capture = True
 
         for key, value in self.topology.get_new_bpf_topology().items():
-            self.processors[ct.c_ulonglong(key)] = value
+            self.processors[ct.c_int(key)] = value
 
         self.bpf_config[ct.c_int(0)] = ct.c_uint(self.selector)  # current selector
-        self.bpf_config[ct.c_int(1)] = ct.c_uint(self.selector)  # old selector
-        self.bpf_config[ct.c_int(2)] = ct.c_uint(self.timeslice)  # timeslice
-        self.bpf_config[ct.c_int(3)] = ct.c_uint(0)  # switch count
+        self.bpf_config[ct.c_int(1)] = ct.c_uint(self.timeslice)  # timeslice
 
         if self.debug == True:
             self.bpf_program["err"].open_perf_buffer(self.print_event, page_cnt=256)
 
-        self.bpf_program.attach_tracepoint(
-            tp="sched:sched_switch", fn_name="trace_switch"
-        )
-        self.bpf_program.attach_tracepoint(
-            tp="sched:sched_process_exit", fn_name="trace_exit"
-        )
+        self._attach_sched_tracepoints()
         self.bpf_program.attach_perf_event(
             ev_type=PerfType.SOFTWARE,
             ev_config=PerfSWConfig.CPU_CLOCK,
@@ -332,16 +458,49 @@ class BpfCollector:
             sample_freq=sample_freq,
         )
 
+    def _attach_sched_tracepoints(self):
+        if "-DRAW_TRACEPOINTS" in self.cflags:
+            try:
+                self.bpf_program.attach_raw_tracepoint(
+                    tp="sched_switch", fn_name="raw_trace_switch"
+                )
+                self.bpf_program.attach_raw_tracepoint(
+                    tp="sched_process_exit", fn_name="raw_trace_exit"
+                )
+                self.raw_tracepoints = True
+                return
+            except Exception as e:
+                print(
+                    f"Error attaching raw tracepoints, using classic ones: {e}",
+                    file=sys.stderr,
+                )
+                try:
+                    self.bpf_program.detach_raw_tracepoint(tp="sched_switch")
+                except Exception:
+                    pass
+
+        self.raw_tracepoints = False
+        self.bpf_program.attach_tracepoint(
+            tp="sched:sched_switch", fn_name="trace_switch"
+        )
+        self.bpf_program.attach_tracepoint(
+            tp="sched:sched_process_exit", fn_name="trace_exit"
+        )
+
     def stop_capture(self):
-        self.bpf_program.detach_tracepoint(tp="sched:sched_switch")
-        self.bpf_program.detach_tracepoint(tp="sched:sched_process_exit")
+        if self.raw_tracepoints:
+            self.bpf_program.detach_raw_tracepoint(tp="sched_switch")
+            self.bpf_program.detach_raw_tracepoint(tp="sched_process_exit")
+        else:
+            self.bpf_program.detach_tracepoint(tp="sched:sched_switch")
+            self.bpf_program.detach_tracepoint(tp="sched:sched_process_exit")
 
     def get_new_sample(self, sample_controller, rapl_monitor):
         sample = self._get_new_sample(rapl_monitor)
         if not self.timed_capture:
             sample_controller.compute_sleep_time(sample.get_sched_switch_count())
             self.timeslice = sample_controller.get_timeslice()
-            self.bpf_config[ct.c_int(2)] = ct.c_uint(self.timeslice)  # timeslice
+            self.bpf_config[ct.c_int(1)] = ct.c_uint(self.timeslice)  # timeslice
 
         if self.debug == True:
             self.bpf_program.kprobe_poll()
@@ -349,14 +508,9 @@ class BpfCollector:
         return sample
 
     def _get_new_sample(self, rapl_monitor):
-        total_execution_time = 0.0
-        sched_switch_count = self.bpf_config[ct.c_int(3)].value
-        tsmax = 0
-
-        # Initialize the weighted cycles for each core to 0
-        total_weighted_cycles = []
-        for socket in self.topology.get_sockets():
-            total_weighted_cycles.append(0)
+        # Per cpu switch counts of the window being closed, they restart as
+        # soon as a cpu sees the new selector
+        switch_counts = self.switch_counts[ct.c_int(0)]
 
         # We use a binary selector so that while userspace is reading events
         # using selector 0 we write events using selector 1 and vice versa.
@@ -386,83 +540,67 @@ class BpfCollector:
         dram_diff = rapl_measurement["dram"]
 
         # Propagate the update of the selector to the eBPF program
-        print(
-            # f"DEBUG: tsmax before selector switch: {self.bpf_global_timestamps[ct.c_int(read_selector)].value}"
-        )
         self.bpf_config[ct.c_int(0)] = ct.c_uint(self.selector)
-        time.sleep(0.01)
-        print(
-            # f"DEBUG: tsmax after selector switch: {self.bpf_global_timestamps[ct.c_int(read_selector)].value}"
-        )
-        # prev_tsmax = self.bpf_global_timestamps[ct.c_int(read_selector)].value
-        # timeout = 0.2  # 200ms max wait
-        # waited = 0
-        # while True:
-        #     tsmax_new = self.bpf_global_timestamps[ct.c_int(read_selector)].value
-        #     if tsmax_new != prev_tsmax:
-        #         break
-        #     time.sleep(0.001)
-        #     waited += 0.001
-        #     if waited >= timeout:
-        #         break
-
-        pid_dict = {}
+        late_cpus = self._wait_for_epoch(self.selector)
+        wall_time = time.time()
 
-        tsmax = self.bpf_global_timestamps[ct.c_int(read_selector)].value
-
-        # Add the count of clock cycles for each active process to the total
-        # number of clock cycles of the socket
-        for key, data in self.pids.items():
-            if data.ts[read_selector] + self.timeslice > tsmax:
-                total_execution_time = (
-                    total_execution_time + float(data.time_ns[read_selector]) / 1000000
-                )
+        # RAPL measures the interval power is averaged over, the monotonic
+        # clock covers hosts without RAPL
+        now = time.monotonic()
+        interval = max([diff.duration for diff in core_diff] or [0])
+        if interval <= 0 and self.last_sample_time is not None:
+            interval = now - self.last_sample_time
+        self.last_sample_time = now
 
-            # if self.power_measure == True:
-            for multisocket_selector in range(
-                read_selector, total_slots_length, self.SELECTOR_DIM
-            ):
-                # Compute the number of total weighted cycles per socket
-                cycles_index = int(multisocket_selector / self.SELECTOR_DIM)
-                # if data.ts[read_selector] + self.timeslice > tsmax:
-                total_weighted_cycles[cycles_index] = (
-                    total_weighted_cycles[cycles_index]
-                    + data.weighted_cycles[multisocket_selector]
-                )
-
-        # Add the count of clock cycles for each idle process to the total
-        # number of clock cycles of the socket
-        for key, data in self.idles.items():
-            if data.ts[read_selector] + self.timeslice > tsmax:
-                total_execution_time = (
-                    total_execution_time + float(data.time_ns[read_selector]) / 1000000
-                )
+        tsmax = self.bpf_global_timestamps[ct.c_int(read_selector)].value
 
-            # if self.power_measure == True:
-            for multisocket_selector in range(
-                read_selector, total_slots_length, self.SELECTOR_DIM
+        # cpus without switches in this window still hold an older count
+        sched_switch_count = 0
+        for switch_count in switch_counts:
+            if (
+                switch_count.bpf_selector == read_selector
+                and switch_count.ts + self.timeslice > tsmax
             ):
-                # Compute the number of total weighted cycles per socket
-                cycles_index = int(multisocket_selector / self.SELECTOR_DIM)
-                # if data.ts[read_selector] + self.timeslice > tsmax:
-                total_weighted_cycles[cycles_index] = (
-                    total_weighted_cycles[cycles_index]
-                    + data.weighted_cycles[multisocket_selector]
-                )
+                sched_switch_count += switch_count.count
+
+        # Read each map once and decode it as NumPy structured arrays
+        self.pids_snapshot.read()
+        self.idles_snapshot.read()
+        pids = self.pids_snapshot.get_values_array()
+        idles = self.idles_snapshot.get_values_array()
+        idle_keys = self.idles_snapshot.get_keys_array().astype(np.int64)
+
+        # Only processes updated in the last timeslice are part of the sample
+        pids_active = pids["ts"][:, read_selector] + self.timeslice > tsmax
+        idles_active = idles["ts"][:, read_selector] + self.timeslice > tsmax
+
+        total_execution_time = (
+            float(pids["time_ns"][pids_active, read_selector].sum())
+            + float(idles["time_ns"][idles_active, read_selector].sum())
+        ) / 1000000
+
+        # Count of clock cycles of each socket, active or not. Slots of the
+        # current selector are read_selector, read_selector + SELECTOR_DIM...
+        pids_weighted_cycles = pids["weighted_cycles"][
+            :, read_selector : total_slots_length : self.SELECTOR_DIM
+        ]
+        idles_weighted_cycles = idles["weighted_cycles"][
+            :, read_selector : total_slots_length : self.SELECTOR_DIM
+        ]
+        total_weighted_cycles = pids_weighted_cycles.sum(
+            axis=0, dtype=np.float64
+        ) + idles_weighted_cycles.sum(axis=0, dtype=np.float64)
 
         # Compute package/core/dram power in mW from RAPL samples
         package_power = [
             package_diff[skt].power_milliw() for skt in self.topology.get_sockets()
         ]
-        # print("Package power: ", package_power)
         core_power = [
             core_diff[skt].power_milliw() for skt in self.topology.get_sockets()
         ]
-        # print("Core power: ", core_power)
         dram_power = [
             dram_diff[skt].power_milliw() for skt in self.topology.get_sockets()
         ]
-        # print("DRAM power: ", dram_power)
 
         total_power = {
             "package": sum(package_power),
@@ -470,102 +608,75 @@ class BpfCollector:
             "dram": sum(dram_power),
         }
 
-        for key, data in self.pids.items():
-            # print(f"DEBUG: Number of entries in self.pids: {len(self.pids)}")
-            # print(f"DEBUG: BPF PID {data.pid} COMM {data.comm} TS {data.ts} ...")
-            proc_info = ProcessInfo(len(self.topology.get_sockets()))
-            proc_info.set_pid(data.pid)
-            proc_info.set_tgid(data.tgid)
-            proc_info.set_comm(data.comm)
-            proc_info.set_cycles(data.cycles[read_selector])
-            proc_info.set_instruction_retired(data.instruction_retired[read_selector])
-            proc_info.set_cache_misses(data.cache_misses[read_selector])
-            proc_info.set_cache_refs(data.cache_refs[read_selector])
-            proc_info.set_time_ns(data.time_ns[read_selector])
-            add_proc = False
-
-            for multisocket_selector in range(
-                read_selector, total_slots_length, self.SELECTOR_DIM
-            ):
-                if data.ts[read_selector] + self.timeslice > tsmax:
-                    socket_info = SocketProcessItem()
-                    socket_info.set_weighted_cycles(
-                        data.weighted_cycles[multisocket_selector]
-                    )
-                    socket_info.set_ts(data.ts[read_selector])
-                    proc_info.set_socket_data(
-                        int(multisocket_selector / self.SELECTOR_DIM), socket_info
-                    )
-                    add_proc = True
-
-            # Try to set container_id using cgroup_id
-            try:
-                cgroup_id = ProcTable.find_cgroup_id(data.pid, data.tgid)
-                if cgroup_id is not None:
-                    proc_info.set_cgroup_id(cgroup_id)
-                    proc_info.set_container_id(cgroup_id[0:12])
-            except Exception:
-                pass
-            # After: cgroup_id = ProcTable.find_cgroup_id_static(data.pid, data.tgid)
-            # print(f"DEBUG: PID {data.pid} TGID {data.tgid} cgroup_id: {cgroup_id}")
-
-            if add_proc:
-                pid_dict[data.pid] = proc_info
-
-                proc_info.set_power(
-                    self._get_pid_power(proc_info, total_weighted_cycles, core_power)
+        # Active pids first, then active idles
+        weighted_cycles = np.concatenate(
+            (pids_weighted_cycles[pids_active], idles_weighted_cycles[idles_active])
+        )
+        idle_tgids = -1 * (1 + idle_keys[idles_active])
+
+        # Core power is split among processes proportionally to their
+        # weighted cycles on each socket
+        cycles_share = np.divide(
+            weighted_cycles,
+            total_weighted_cycles,
+            out=np.zeros(weighted_cycles.shape),
+            where=total_weighted_cycles > 0,
+        )
+        power = cycles_share @ np.asarray(core_power, dtype=np.float64)
+
+        time_ns = np.concatenate(
+            (
+                pids["time_ns"][pids_active, read_selector],
+                idles["time_ns"][idles_active, read_selector],
+            )
+        )
+        # cpu usage in percentage of a core, not computed for idle tasks
+        cpu_usage = np.zeros(len(time_ns))
+        if total_execution_time != 0:
+            active_pids_count = int(pids_active.sum())
+            cpu_usage[:active_pids_count] = (
+                time_ns[:active_pids_count].astype(np.float64)
+                / 1000000
+                / total_execution_time
+                * multiprocessing.cpu_count()
+                * 100
+            )
+
+        columns = {
+            "key": np.concatenate(
+                (pids["pid"][pids_active].astype(np.int64), idle_tgids)
+            ),
+            "pid": np.concatenate((pids["pid"][pids_active], idles["pid"][idles_active])),
+            "tgid": np.concatenate(
+                (pids["tgid"][pids_active].astype(np.int64), idle_tgids)
+            ),
+            "comm": np.concatenate(
+                (
+                    self._get_comm_column(pids, pids_active),
+                    self._get_comm_column(idles, idles_active),
                 )
-                # print("DEBUG: total_weighted_cycles:", total_weighted_cycles)
-                # print("DEBUG: core_power:", core_power)
-                # else:
-                #     proc_info.set_power(0)
-                proc_info.compute_cpu_usage_millis(
-                    float(total_execution_time), multiprocessing.cpu_count()
+            ),
+            "cgroup_id": np.concatenate(
+                (pids["cgroup_id"][pids_active], idles["cgroup_id"][idles_active])
+            ),
+            "weighted_cycles": weighted_cycles,
+            "ts": np.concatenate(
+                (
+                    pids["ts"][pids_active, read_selector],
+                    idles["ts"][idles_active, read_selector],
                 )
-
-        for key, data in self.idles.items():
-            proc_info = ProcessInfo(len(self.topology.get_sockets()))
-            proc_info.set_pid(data.pid)
-            proc_info.set_tgid(-1 * (1 + int(key.value)))
-            proc_info.set_comm(data.comm)
-            proc_info.set_cycles(data.cycles[read_selector])
-            proc_info.set_instruction_retired(data.instruction_retired[read_selector])
-            proc_info.set_cache_misses(data.cache_misses[read_selector])
-            proc_info.set_cache_refs(data.cache_refs[read_selector])
-            proc_info.set_time_ns(data.time_ns[read_selector])
-            add_proc = False
-
-            for multisocket_selector in range(
-                read_selector, total_slots_length, self.SELECTOR_DIM
-            ):
-                if data.ts[read_selector] + self.timeslice > tsmax:
-                    socket_info = SocketProcessItem()
-                    socket_info.set_weighted_cycles(
-                        data.weighted_cycles[multisocket_selector]
-                    )
-                    socket_info.set_ts(data.ts[read_selector])
-                    proc_info.set_socket_data(
-                        int(multisocket_selector / self.SELECTOR_DIM), socket_info
-                    )
-                    add_proc = True
-
-            # Try to set container_id using cgroup_id
-            try:
-                cgroup_id = ProcTable.find_cgroup_id(data.pid, data.tgid)
-                if cgroup_id is not None:
-                    proc_info.set_cgroup_id(cgroup_id)
-                    proc_info.set_container_id(cgroup_id[0:12])
-            except Exception:
-                pass
-            # After: cgroup_id = ProcTable.find_cgroup_id_static(data.pid, data.tgid)
-            # print(f"DEBUG: PID {data.pid} TGID {data.tgid} cgroup_id: {cgroup_id}")
-
-            if add_proc:
-                pid_dict[-1 * (1 + int(key.value))] = proc_info
-                proc_info.set_power(
-                    self._get_pid_power(proc_info, total_weighted_cycles, core_power)
+            ),
+            "time_ns": time_ns,
+            "power": power,
+            "cpu_usage": cpu_usage,
+        }
+        for counter in ["cycles", "instruction_retired", "cache_misses", "cache_refs"]:
+            columns[counter] = np.concatenate(
+                (
+                    pids[counter][pids_active, read_selector],
+                    idles[counter][idles_active, read_selector],
                 )
-                # print(f"DEBUG: PID {data.pid} power: {proc_info.get_power()}")
+            )
 
         return BpfSample(
             tsmax,
@@ -573,28 +684,39 @@ class BpfCollector:
             sched_switch_count,
             self.timeslice,
             total_power,
-            pid_dict,
+            None,
             self.topology.get_hyperthread_count(),
+            columns,
+            self.container_cache,
+            late_cpus,
+            wall_time,
+            interval,
         )
 
-    # def _get_pid_power(self, pid, total_cycles, core_power):
-    #     pid_power = 0
-    #     for socket in self.topology.get_sockets():
-    #         if float(total_cycles[socket]) > 0:
-    #             pid_power = pid_power + (
-    #                 core_power[socket]
-    #                 * (
-    #                     float(pid.get_socket_data(socket).get_weighted_cycles())
-    #                     / float(total_cycles[socket])
-    #                 )
-    #             )
-    #     return pid_power
-
-    def _get_pid_power(self, pid, total_cycles, core_power):
-        pid_power = 0.0
-        for socket in self.topology.get_sockets():
-            tc = float(total_cycles[socket])
-            if tc > 0:
-                wc = float(pid.get_socket_data(socket).get_weighted_cycles())
-                pid_power += core_power[socket] * (wc / tc)
-        return pid_power
+    def _read_epochs(self):
+        if self.epochs_mapping is not None:
+            # copy, the kernel keeps writing the mapped memory
+            return np.array(self.epochs_mapping.get_values_array()["state"])
+        self.epochs_snapshot.read()
+        return np.array(self.epochs_snapshot.get_values_array()["state"])
+
+    def _wait_for_epoch(self, selector):
+        # a cpu is done with the old selector when no handler is running on
+        # it or its last handler already read the new selector
+        deadline = time.monotonic() + self.epoch_timeout
+        while True:
+            states = self._read_epochs()
+            done = ((states & 1) == 0) | ((states >> 1) == selector)
+            if done.all():
+                return 0
+            if time.monotonic() >= deadline:
+                return int((~done).sum())
+            time.sleep(0.0001)
+
+    def _get_comm_column(self, values, mask):
+        # char[TASK_COMM_LEN] is decoded as TASK_COMM_LEN single bytes,
+        # view each row as one null padded string
+        comm = np.ascontiguousarray(values["comm"][mask])
+        if comm.ndim == 1:
+            return comm
+        return comm.view("S%d" % comm.shape[1]).reshape(len(comm))
@@ -0,0 +1,156 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from bcc.libbcc import lib
+import ctypes as ct
+import errno
+import mmap
+import numpy as np
+import os
+import platform
+import sys
+
+
+class BpfTableSnapshot:
+    """
+    Point in time copy of a BPF map into preallocated ctypes buffers.
+
+    The map is read with BPF_MAP_LOOKUP_BATCH when the kernel (>= 5.6) and
+    bcc support it, a few syscalls for the whole table instead of two per
+    key. Otherwise it falls back to the usual bcc iteration. Keys and
+    values stay valid until the next call to read(), the same holds for
+    the NumPy views returned by get_keys_array() and get_values_array().
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.max_entries = int(table.max_entries)
+        self.key_size = ct.sizeof(table.Key)
+        self.leaf_size = ct.sizeof(table.Leaf)
+        self.keys = (table.Key * self.max_entries)()
+        self.values = (table.Leaf * self.max_entries)()
+        self.size = 0
+
+        # NumPy layouts matching the ctypes ones, padding included
+        self.key_dtype = np.dtype(table.Key)
+        self.leaf_dtype = np.dtype(table.Leaf)
+
+        self.batch = ct.c_uint32(0)
+        self.count = ct.c_uint32(0)
+        self.batch_supported = hasattr(lib, "bpf_lookup_batch")
+
+    def read(self):
+        if self.batch_supported:
+            try:
+                self.size = self._read_batch()
+                return self.size
+            except OSError as e:
+                # EINVAL/ENOTSUPP on kernels without batch ops for this map
+                print(
+                    f"Batched map lookup not available ({e}), iterating keys",
+                    file=sys.stderr,
+                )
+                self.batch_supported = False
+        self.size = self._read_items()
+        return self.size
+
+    def items(self):
+        for index in range(self.size):
+            yield self.keys[index], self.values[index]
+
+    def get_keys_array(self):
+        return np.frombuffer(self.keys, dtype=self.key_dtype, count=self.size)
+
+    def get_values_array(self):
+        # structured array sharing memory with the ctypes buffer, no copy
+        return np.frombuffer(self.values, dtype=self.leaf_dtype, count=self.size)
+
+    def __len__(self):
+        return self.size
+
+    def _read_batch(self):
+        total = 0
+        keys_address = ct.addressof(self.keys)
+        values_address = ct.addressof(self.values)
+        while total < self.max_entries:
+            self.count.value = self.max_entries - total
+            ret = lib.bpf_lookup_batch(
+                self.table.map_fd,
+                ct.byref(self.batch) if total > 0 else None,
+                ct.byref(self.batch),
+                ct.c_void_p(keys_address + total * self.key_size),
+                ct.c_void_p(values_address + total * self.leaf_size),
+                ct.byref(self.count),
+            )
+            errcode = ct.get_errno()
+            total += self.count.value
+            if ret != 0:
+                if errcode == errno.ENOENT:
+                    # the whole map has been read
+                    break
+                raise OSError(errcode, os.strerror(errcode))
+            if self.count.value == 0:
+                break
+        return total
+
+    def _read_items(self):
+        size = 0
+        for key, value in self.table.items():
+            if size >= self.max_entries:
+                break
+            self.keys[size] = key
+            self.values[size] = value
+            size += 1
+        return size
+
+
+class BpfArrayMapping:
+    """
+    Read-only NumPy view of a BPF_F_MMAPABLE array map.
+
+    Values are read straight from the memory shared with the kernel, every
+    access sees the current content of the map without any syscall.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.max_entries = int(table.max_entries)
+        self.leaf_dtype = np.dtype(table.Leaf)
+        length = self.leaf_dtype.itemsize * self.max_entries
+        length = (length + mmap.PAGESIZE - 1) // mmap.PAGESIZE * mmap.PAGESIZE
+        self.mapping = mmap.mmap(
+            table.map_fd, length, flags=mmap.MAP_SHARED, prot=mmap.PROT_READ
+        )
+        self.values = np.frombuffer(
+            self.mapping, dtype=self.leaf_dtype, count=self.max_entries
+        )
+
+    def get_values_array(self):
+        return self.values
+
+
+def kernel_supports_mmapable_maps():
+    # BPF_F_MMAPABLE array maps are available since Linux 5.5
+    release = platform.release().split("-")[0].split(".")
+    try:
+        version = (int(release[0]), int(release[1]))
+    except (IndexError, ValueError):
+        return False
+    return version >= (5, 5)
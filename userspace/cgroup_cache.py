@@ -0,0 +1,208 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+import os
+import platform
+import threading
+import time
+
+CONTAINER_ID_LEN = 64
+
+# marker for cgroup ids that are not part of the cgroupfs snapshot
+_UNKNOWN_CGROUP = object()
+
+
+class CgroupCache:
+    """
+    Shared pid -> container id resolution cache.
+
+    Entries are keyed by (pid, start time) so that a recycled pid never
+    inherits the container of the process that used it before. The cache
+    is bounded and evicts the least recently used entries first.
+
+    When the eBPF programs provide the cgroup id of a task the container is
+    resolved from a snapshot of the cgroup v2 tree instead, so no file under
+    /proc is read at all.
+    """
+
+    def __init__(
+        self,
+        proc_paths=("/host/proc", "/proc"),
+        cgroup_paths=("/host/sys/fs/cgroup", "/sys/fs/cgroup"),
+        max_entries=65536,
+        rescan_interval=1.0,
+    ):
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        # collectors run on concurrent threads
+        self.lock = threading.RLock()
+
+        # resolve the proc root once, prefer the host one when mounted
+        self.proc_path = proc_paths[-1]
+        for path in proc_paths:
+            if os.path.isdir(path):
+                self.proc_path = path
+                break
+
+        # cgroup ids are only meaningful on a pure cgroup v2 host. On hybrid
+        # hosts the unified hierarchy does not follow the docker cgroups.
+        self.cgroup_path = None
+        for path in cgroup_paths:
+            if os.path.exists(os.path.join(path, "cgroup.controllers")):
+                self.cgroup_path = path
+                break
+        self.cgroup_ids = {}
+        self.rescan_interval = rescan_interval
+        self.last_scan = 0
+
+    def get_proc_path(self):
+        return self.proc_path
+
+    def get_cgroup_path(self):
+        return self.cgroup_path
+
+    def get_container_id(self, pid, tgid=None, cgroup_id=0):
+        # returns the full container id of pid, None for host processes
+        with self.lock:
+            return self._get_container_id(pid, tgid, cgroup_id)
+
+    def _get_container_id(self, pid, tgid, cgroup_id):
+        if cgroup_id:
+            container_id = self._get_container_id_by_cgroup(cgroup_id)
+            if container_id is not _UNKNOWN_CGROUP:
+                return container_id
+
+        for id in [pid, tgid]:
+            if id is None or id <= 0:
+                continue
+            start_time = self._read_start_time(id)
+            if start_time is None:
+                # process has already terminated, try with the tgid
+                continue
+
+            key = (id, start_time)
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+            container_id = self._read_container_id(id)
+            self.cache[key] = container_id
+            if len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+            return container_id
+        return None
+
+    def _get_container_id_by_cgroup(self, cgroup_id):
+        if self.cgroup_path is None:
+            return _UNKNOWN_CGROUP
+        container_id = self._lookup_cgroup(cgroup_id)
+        if container_id is _UNKNOWN_CGROUP:
+            # new cgroups appear with new containers, refresh the snapshot
+            # but never walk the tree more than once per rescan interval
+            if time.monotonic() - self.last_scan >= self.rescan_interval:
+                self._scan_cgroups()
+                container_id = self._lookup_cgroup(cgroup_id)
+        return container_id
+
+    def _lookup_cgroup(self, cgroup_id):
+        if cgroup_id in self.cgroup_ids:
+            return self.cgroup_ids[cgroup_id]
+        # before 5.5 the cgroup id also carries the generation in the
+        # upper 32 bits, while the directory inode is just the lower ones
+        return self.cgroup_ids.get(cgroup_id & 0xFFFFFFFF, _UNKNOWN_CGROUP)
+
+    def _scan_cgroups(self):
+        # map the inode of every cgroup directory to the container owning
+        # it, nested cgroups inherit the container of their ancestors
+        cgroup_ids = {}
+        try:
+            cgroup_ids[os.stat(self.cgroup_path).st_ino] = None
+        except OSError:
+            pass
+
+        stack = [(self.cgroup_path, None)]
+        while stack:
+            path, container_id = stack.pop()
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                # cgroup removed while walking the tree
+                continue
+            for entry in entries:
+                try:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    child_id = parse_container_id(entry.name) or container_id
+                    cgroup_ids[entry.inode()] = child_id
+                except OSError:
+                    continue
+                stack.append((entry.path, child_id))
+
+        self.cgroup_ids = cgroup_ids
+        self.last_scan = time.monotonic()
+
+    def _read_start_time(self, pid):
+        try:
+            with open(os.path.join(self.proc_path, str(pid), "stat"), "r") as f:
+                stat = f.read()
+        except IOError:
+            return None
+        # comm can contain spaces and parenthesis, start after the last one.
+        # starttime is field 22, that is the 20th after the comm field
+        fields = stat[stat.rfind(")") + 2:].split(" ")
+        if len(fields) < 20:
+            return None
+        return fields[19]
+
+    def _read_container_id(self, pid):
+        try:
+            with open(os.path.join(self.proc_path, str(pid), "cgroup"), "r") as f:
+                for line in f:
+                    container_id = parse_container_id(line)
+                    if container_id is not None:
+                        return container_id
+        except IOError:  # proc has already terminated
+            pass
+        return None
+
+
+def kernel_supports_cgroup_id():
+    # bpf_get_current_cgroup_id() is available since Linux 4.18
+    release = platform.release().split("-")[0].split(".")
+    try:
+        version = (int(release[0]), int(release[1]))
+    except (IndexError, ValueError):
+        return False
+    return version >= (4, 18)
+
+
+def parse_container_id(cgroup_path):
+    # extract the container id from the last element of a cgroup path
+    last = cgroup_path.rstrip("\n").split("/")[-1]
+    # Non-systemd Docker
+    if len(last) == CONTAINER_ID_LEN:
+        return last
+    # systemd Docker
+    if last.startswith("docker-") and last.endswith(".scope"):
+        new_id = last[len("docker-"):-len(".scope")]
+        if len(new_id) == CONTAINER_ID_LEN:
+            return new_id
+    return None
@@ -0,0 +1,117 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError
+import sys
+
+
+class CollectorPool:
+    """
+    Runs the collectors of a sampling tick concurrently.
+
+    Collectors mostly wait on syscalls and /proc reads, which release the
+    GIL. A collector that does not finish within its timeout keeps running
+    in background, no new run of that collector is started until the
+    pending one completes.
+
+    Gauge collectors (mem) give the tick their last good result instead.
+    Collectors registered with a merge function return deltas and clear
+    their maps on each read: the tick gets None, and the late result is
+    merged into the next one so no window is counted twice or lost.
+    """
+
+    def __init__(self, max_workers=4, timeout=0.5):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="collector"
+        )
+        self.timeout = timeout
+        self.timeouts = {}
+        self.futures = {}
+        self.last_results = {}
+        self.merge_fns = {}
+        self.pending_results = {}
+
+    def set_timeout(self, name, timeout):
+        self.timeouts[name] = timeout
+
+    def set_merge(self, name, merge_fn):
+        # merge_fn(older, newer) returns the sum of two delta results
+        self.merge_fns[name] = merge_fn
+
+    def submit(self, name, fn, *args):
+        future = self.futures.get(name)
+        if future is not None and not future.done():
+            # still running from a previous tick
+            return
+        if future is not None:
+            # completed after its tick gave up on it
+            self._store_result(name, future)
+        self.futures[name] = self.executor.submit(fn, *args)
+
+    def get_result(self, name):
+        future = self.futures.get(name)
+        if future is None:
+            return self._take_result(name)
+        try:
+            future.result(timeout=self.timeouts.get(name, self.timeout))
+        except TimeoutError:
+            if name in self.merge_fns:
+                print(
+                    f"Collector {name} timed out, merging it into the next sample",
+                    file=sys.stderr,
+                )
+                return None
+            print(f"Collector {name} timed out, using its last sample", file=sys.stderr)
+            return self.last_results.get(name)
+        except Exception:
+            pass
+        self._store_result(name, future)
+        self.futures.pop(name, None)
+        return self._take_result(name)
+
+    def _store_result(self, name, future):
+        merge_fn = self.merge_fns.get(name)
+        try:
+            result = future.result(timeout=0)
+        except Exception as e:
+            if merge_fn is not None:
+                print(f"Collector {name} failed: {e}", file=sys.stderr)
+            else:
+                print(
+                    f"Collector {name} failed, using its last sample: {e}",
+                    file=sys.stderr,
+                )
+            return
+        if merge_fn is None:
+            self.last_results[name] = result
+        elif name in self.pending_results:
+            self.pending_results[name] = merge_fn(self.pending_results[name], result)
+        else:
+            self.pending_results[name] = result
+
+    def _take_result(self, name):
+        if name in self.merge_fns:
+            # deltas are reported once
+            return self.pending_results.pop(name, None)
+        return self.last_results.get(name)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,166 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from .container_info import ContainerInfo
+import math
+import time
+
+# counters accumulated over the window
+SUM_FIELDS = [
+    "cycles",
+    "weighted_cycles",
+    "instruction_retired",
+    "cache_misses",
+    "cache_refs",
+    "time_ns",
+    "kb_r",
+    "kb_w",
+    "bytes_r",
+    "bytes_w",
+    "num_r",
+    "num_w",
+    "tcp_transaction_count",
+    "tcp_byte_tx",
+    "tcp_byte_rx",
+    "http_transaction_count",
+    "http_byte_tx",
+    "http_byte_rx",
+]
+
+# rates averaged over the time of the window
+MEAN_FIELDS = ["power", "cpu_usage"]
+
+# gauges, the last value of the window is kept
+LAST_FIELDS = [
+    "mem_RSS",
+    "mem_PSS",
+    "mem_USS",
+    "mem_usage",
+    "tcp_percentiles",
+    "http_percentiles",
+    "totals",
+]
+
+# latencies weighted by the number of operations of each tick
+WEIGHTED_FIELDS = [
+    ("disk_avg_lat", ["num_r", "num_w"]),
+    ("tcp_avg_latency", ["tcp_transaction_count"]),
+    ("http_avg_latency", ["http_transaction_count"]),
+]
+
+
+class ContainerDownsampler:
+    """
+    Aggregates high frequency container samples into coarser windows.
+
+    add() is called once per sampling tick and returns the aggregated
+    containers when a window is complete, None otherwise. Windows are
+    aligned on period seconds of the wall clock and rates are weighted by
+    the measured interval of each sample, so coalesced ticks count for the
+    time they cover. Containers missing from a tick count as idle for that
+    tick.
+    """
+
+    def __init__(self, frequency, period=1.0):
+        self.frequency = float(frequency)
+        self.period = float(period)
+        self.window_end = None
+        self.duration = 0.0
+        self.window = {}
+
+    def get_period(self):
+        return self.period
+
+    def add(self, container_dict, interval=None, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        if not interval or interval <= 0:
+            # nominal tick when the interval was not measured
+            interval = 1 / self.frequency
+        if self.window_end is None:
+            self.window_end = self._get_window_end(timestamp)
+
+        self.duration += interval
+        for container_id, value in container_dict.items():
+            if container_id not in self.window:
+                self.window[container_id] = _WindowAccumulator()
+            self.window[container_id].add(value, interval)
+
+        if timestamp < self.window_end:
+            return None
+
+        aggregated = {}
+        for container_id, accumulator in self.window.items():
+            aggregated[container_id] = accumulator.get_container_info(
+                container_id, self.duration
+            )
+        self.window_end = self._get_window_end(timestamp)
+        self.duration = 0.0
+        self.window = {}
+        return aggregated
+
+    def _get_window_end(self, timestamp):
+        return (math.floor(timestamp / self.period) + 1) * self.period
+
+
+class _WindowAccumulator:
+    def __init__(self):
+        self.sums = dict.fromkeys(SUM_FIELDS + MEAN_FIELDS, 0)
+        self.weighted = {}
+        self.weights = {}
+        for field, _ in WEIGHTED_FIELDS:
+            self.weighted[field] = 0.0
+            self.weights[field] = 0
+        self.last = None
+        self.pid_set = set()
+        self.timestamp = 0
+
+    def add(self, value, interval):
+        for field in SUM_FIELDS:
+            self.sums[field] += getattr(value, field, 0) or 0
+        for field in MEAN_FIELDS:
+            self.sums[field] += (getattr(value, field, 0) or 0) * interval
+        for field, weight_fields in WEIGHTED_FIELDS:
+            weight = sum(getattr(value, f, 0) or 0 for f in weight_fields)
+            self.weighted[field] += (getattr(value, field, 0) or 0) * weight
+            self.weights[field] += weight
+        self.pid_set.update(value.get_pid_set())
+        self.timestamp = max(self.timestamp, value.get_timestamp())
+        self.last = value
+
+    def get_container_info(self, container_id, duration):
+        info = ContainerInfo(container_id)
+        info.set_container_name(self.last.get_container_name())
+        info.set_container_image(self.last.get_container_image())
+        info.set_container_labels(self.last.get_container_labels())
+        info.set_pid_set(self.pid_set)
+        info.set_timestamp(self.timestamp)
+        info.set_weighted_threads(self.last.weighted_threads)
+
+        for field in SUM_FIELDS:
+            setattr(info, field, self.sums[field])
+        for field in MEAN_FIELDS:
+            setattr(info, field, float(self.sums[field]) / duration)
+        for field in LAST_FIELDS:
+            setattr(info, field, getattr(self.last, field))
+        for field, _ in WEIGHTED_FIELDS:
+            if self.weights[field] > 0:
+                setattr(info, field, self.weighted[field] / self.weights[field])
+        return info
@@ -49,13 +49,17 @@ class ContainerInfo:
 
         #memory metrics
         self.mem_RSS = 0
-        self.mem_PSS = 0
-        self.mem_USS = 0
+        # None when not measured
+        self.mem_PSS = None
+        self.mem_USS = None
+        self.mem_usage = 0
         #disk metrics
         self.kb_r = 0
         self.kb_w = 0
         self.num_r = 0
         self.num_w = 0
+        self.bytes_r = 0
+        self.bytes_w = 0
         self.disk_avg_lat = 0
 
         self.tcp_transaction_count = 0
@@ -88,6 +92,39 @@ class ContainerInfo:
         self.weighted_threads = 0
         self.weighted_cpus = []
 
+        # counters accumulated since the container was first seen
+        self.totals = {}
+
+    def set_cycles(self, cycles):
+        self.cycles = cycles
+
+    def set_weighted_cycles(self, weighted_cycles):
+        self.weighted_cycles = weighted_cycles
+
+    def set_instructions(self, instructions):
+        self.instruction_retired = instructions
+
+    def set_cache_misses(self, cache_misses):
+        self.cache_misses = cache_misses
+
+    def set_cache_refs(self, cache_refs):
+        self.cache_refs = cache_refs
+
+    def set_time_ns(self, time_ns):
+        self.time_ns = time_ns
+
+    def set_power(self, power):
+        self.power = float(power)
+
+    def set_cpu_usage(self, cpu_usage):
+        self.cpu_usage = float(cpu_usage)
+
+    def set_pid_set(self, pid_set):
+        self.pid_set = pid_set
+
+    def set_weighted_threads(self, weighted_threads):
+        self.weighted_threads = weighted_threads
+
     def add_weighted_cycles(self, new_cycles):
         self.weighted_cycles = self.weighted_cycles + new_cycles
 
@@ -141,6 +178,9 @@ class ContainerInfo:
     def set_mem_USS(self, uss):
         self.mem_USS = uss
 
+    def set_mem_usage(self, usage):
+        self.mem_usage = usage
+
     def set_disk_kb_r(self, kb_r):
         self.kb_r = kb_r
 
@@ -153,9 +193,18 @@ class ContainerInfo:
     def set_disk_num_w(self, num_w):
         self.num_w = num_w
 
+    def set_disk_bytes_r(self, bytes_r):
+        self.bytes_r = bytes_r
+
+    def set_disk_bytes_w(self, bytes_w):
+        self.bytes_w = bytes_w
+
     def set_disk_avg_lat(self, avg_lat):
         self.disk_avg_lat = avg_lat
 
+    def set_totals(self, totals):
+        self.totals = totals
+
     def add_weighted_cpu_usage(self, cpu_usage):
         self.weighted_cpus.append(cpu_usage)
         max = 0
@@ -303,6 +352,9 @@ class ContainerInfo:
     def get_mem_USS(self):
         return self.mem_USS
 
+    def get_mem_usage(self):
+        return self.mem_usage
+
     def get_kb_r(self):
         return self.kb_r
 
@@ -315,9 +367,18 @@ class ContainerInfo:
     def get_num_w(self):
         return self.num_w
 
+    def get_bytes_r(self):
+        return self.bytes_r
+
+    def get_bytes_w(self):
+        return self.bytes_w
+
     def get_disk_avg_lat(self):
         return self.disk_avg_lat
 
+    def get_totals(self):
+        return self.totals
+
     def get_http_transaction_count(self):
         return self.http_transaction_count
 
@@ -429,6 +490,7 @@ class ContainerInfo:
                 'mem_RSS': self.mem_RSS,
                 'mem_PSS': self.mem_PSS,
                 'mem_USS': self.mem_USS,
+                'mem_usage': self.mem_usage,
                 # Disk
                 'kb_r': self.kb_r,
                 'kb_w': self.kb_w,
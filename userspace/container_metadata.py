@@ -0,0 +1,159 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import namedtuple
+import queue
+import threading
+import time
+import docker
+import sys
+
+ContainerMetadata = namedtuple("ContainerMetadata", ["name", "image", "labels"])
+
+SHORT_ID_LEN = 12
+
+
+class DockerMetadataCache:
+    """
+    Container metadata (name, image, labels) kept up to date in background.
+
+    One thread follows the Docker events stream, another one back-fills the
+    ids requested by the sampling loop that are not known yet. get() never
+    talks to the Docker daemon, so a slow daemon cannot stall sampling.
+    """
+
+    def __init__(self, timeout=2, retry_interval=30):
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.metadata = {}
+        # ids docker does not know about, with the time of the last attempt
+        self.missing = {}
+        self.requested = set()
+        self.lock = threading.Lock()
+        self.backfill_queue = queue.Queue()
+
+        # one client per thread, the event stream is a long lived request
+        self.docker_client = docker.from_env(timeout=self.timeout)
+        self.events_client = docker.from_env(timeout=self.timeout)
+
+        self.events_thread = threading.Thread(
+            target=self._follow_events, name="docker-events", daemon=True
+        )
+        self.backfill_thread = threading.Thread(
+            target=self._backfill, name="docker-backfill", daemon=True
+        )
+        self.events_thread.start()
+        self.backfill_thread.start()
+
+    def get(self, container_id):
+        # hot path: dict lookup, schedule a back-fill if the id is unknown
+        short_id = container_id[:SHORT_ID_LEN]
+        metadata = self.metadata.get(short_id)
+        if metadata is None:
+            self._request(short_id)
+        return metadata
+
+    def _request(self, short_id):
+        with self.lock:
+            if short_id in self.requested:
+                return
+            last_attempt = self.missing.get(short_id)
+            if last_attempt is not None and time.monotonic() - last_attempt < self.retry_interval:
+                return
+            self.requested.add(short_id)
+        self.backfill_queue.put(short_id)
+
+    def _backfill(self):
+        while True:
+            short_id = self.backfill_queue.get()
+            try:
+                self._inspect(short_id)
+            except docker.errors.NotFound:
+                with self.lock:
+                    self.missing[short_id] = time.monotonic()
+            except Exception as e:
+                # daemon slow or unavailable, try again later
+                print(
+                    f"Failed to retrieve metadata for container {short_id}: {e}",
+                    file=sys.stderr,
+                )
+                with self.lock:
+                    self.missing[short_id] = time.monotonic()
+            finally:
+                with self.lock:
+                    self.requested.discard(short_id)
+
+    def _inspect(self, container_id):
+        container = self.docker_client.containers.get(container_id)
+        self._store(container)
+
+    def _store(self, container):
+        metadata = ContainerMetadata(
+            str(container.name),
+            str(container.attrs.get("Config", {}).get("Image", "")),
+            container.labels,
+        )
+        short_id = container.id[:SHORT_ID_LEN]
+        self.metadata[short_id] = metadata
+        with self.lock:
+            self.missing.pop(short_id, None)
+
+    def _follow_events(self):
+        backoff = 1
+        while True:
+            try:
+                since = int(time.time())
+                # catch up with the containers started while disconnected
+                for container in self.events_client.containers.list():
+                    self._store(container)
+                events = self.events_client.events(
+                    decode=True, since=since, filters={"type": "container"}
+                )
+                backoff = 1
+                for event in events:
+                    self._handle_event(event)
+            except Exception as e:
+                print(f"Docker event stream interrupted: {e}", file=sys.stderr)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def _handle_event(self, event):
+        action = event.get("Action", event.get("status", ""))
+        container_id = event.get("Actor", {}).get("ID", event.get("id", ""))
+        if not container_id:
+            return
+        short_id = container_id[:SHORT_ID_LEN]
+        if action in ("die", "destroy"):
+            # stopped containers are no longer sampled, a restart is
+            # inspected again on its start event
+            now = time.monotonic()
+            self.metadata.pop(short_id, None)
+            with self.lock:
+                # late lookups of the id do not reach the daemon
+                self.missing[short_id] = now
+                for key, ts in list(self.missing.items()):
+                    if ts + self.retry_interval < now:
+                        del self.missing[key]
+        elif action in ("create", "start", "rename", "update"):
+            with self.lock:
+                if short_id in self.requested:
+                    return
+                self.requested.add(short_id)
+            self.backfill_queue.put(short_id)
@@ -0,0 +1,159 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+import atexit
+import csv
+import os
+import threading
+import time
+
+# container metrics written in each row, shared by the file based outputs
+CONTAINER_FIELDS = [
+    "cycles",
+    "weighted_cycles",
+    "instruction_retired",
+    "cache_misses",
+    "cache_refs",
+    "time_ns",
+    "power",
+    "cpu_usage",
+    "mem_RSS",
+    "mem_PSS",
+    "mem_USS",
+    "mem_usage",
+    "kb_r",
+    "kb_w",
+    "num_r",
+    "num_w",
+    "disk_avg_lat",
+]
+
+# metrics holding floating point values, the others are integer counters
+FLOAT_FIELDS = ["power", "cpu_usage", "disk_avg_lat"]
+
+# metrics left empty (None) when they were not measured, e.g. PSS and USS
+# with the cgroup memory mode
+OPTIONAL_FIELDS = ["mem_PSS", "mem_USS"]
+
+CSV_HEADER = ["timestamp", "container_name"] + CONTAINER_FIELDS
+
+
+class ContainerCsvWriter:
+    """
+    Appends one wide row per container and sample to
+    <base_dir>/<container_id>/timeseries.csv, or to other files of the
+    container folder through write_rows().
+
+    Files stay open in an LRU cache of at most max_open_files handles and
+    are flushed every flush_interval seconds, so a sample costs one
+    buffered write per container instead of a handful of syscalls per
+    metric.
+    """
+
+    def __init__(
+        self, base_dir, max_open_files=128, flush_interval=5.0, clock=time.monotonic
+    ):
+        self.base_dir = base_dir
+        self.max_open_files = max(1, int(max_open_files))
+        self.flush_interval = float(flush_interval)
+        self.clock = clock
+        # (container id, file name) -> (file, csv writer), least recently
+        # used first
+        self.handles = OrderedDict()
+        self.last_flush = self.clock()
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def get_base_dir(self):
+        return self.base_dir
+
+    def write(self, batch, indices):
+        timestamp = round(float(batch.timestamp), 3)
+        self.write_rows(
+            (
+                batch.container_ids[index],
+                [timestamp, batch.container_names[index]] + batch.rows[index],
+            )
+            for index in indices
+        )
+
+    def write_rows(self, rows, file_name="timeseries.csv", header=CSV_HEADER):
+        # rows are (container id, row) pairs
+        with self.lock:
+            for container_id, row in rows:
+                self._get_writer(str(container_id), file_name, header).writerow(row)
+
+            now = self.clock()
+            if now - self.last_flush >= self.flush_interval:
+                self._flush()
+                self.last_flush = now
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            while self.handles:
+                _, (csvfile, _) = self.handles.popitem(last=False)
+                csvfile.close()
+
+    def _flush(self):
+        for csvfile, _ in self.handles.values():
+            csvfile.flush()
+
+    def _get_writer(self, container_id, file_name, header):
+        key = (container_id, file_name)
+        handle = self.handles.get(key)
+        if handle is not None:
+            self.handles.move_to_end(key)
+            return handle[1]
+
+        if len(self.handles) >= self.max_open_files:
+            _, (csvfile, _) = self.handles.popitem(last=False)
+            csvfile.close()
+
+        container_dir = os.path.join(self.base_dir, container_id)
+        os.makedirs(container_dir, exist_ok=True)
+        path = self._get_path(container_dir, file_name, header)
+        csvfile = open(path, "a", newline="")
+        writer = csv.writer(csvfile)
+        if csvfile.tell() == 0:
+            writer.writerow(header)
+        self.handles[key] = (csvfile, writer)
+        return writer
+
+    def _get_path(self, container_dir, file_name, header):
+        # files written with other columns, e.g. by an older version, are
+        # not appended to. Rows go to the first name-N.ext with this header
+        name, extension = os.path.splitext(file_name)
+        suffix = 0
+        while True:
+            path = os.path.join(container_dir, file_name)
+            try:
+                with open(path, "r", newline="") as existing:
+                    existing_header = next(csv.reader(existing), None)
+            except FileNotFoundError:
+                return path
+            if existing_header is None or existing_header == list(header):
+                return path
+            suffix += 1
+            file_name = f"{name}-{suffix}{extension}"
@@ -0,0 +1,83 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import time
+
+
+class DeadlineScheduler:
+    """
+    Paces the monitor loop on absolute deadlines of a monotonic clock.
+
+    Deadlines are start + k * period, so the time spent sampling does not
+    add up to the period. When a tick overruns one or more deadlines they
+    are skipped and the loop ticks right away, keeping the original grid.
+    """
+
+    def __init__(self, period, clock=time.monotonic, sleep=time.sleep):
+        self.period = float(period)
+        self.clock = clock
+        self.sleep = sleep
+        self.next_deadline = None
+        self.last_tick = None
+
+        self.overruns = 0
+        self.skipped_ticks = 0
+        # delay of the last tick w.r.t. its deadline
+        self.lateness = 0.0
+        # difference between the last measured period and the nominal one
+        self.period_jitter = 0.0
+
+    def wait(self):
+        now = self.clock()
+        if self.next_deadline is None:
+            self.next_deadline = now + self.period
+
+        delay = self.next_deadline - now
+        if delay > 0:
+            self.sleep(delay)
+        else:
+            # the previous tick overran, coalesce the missed deadlines
+            self.overruns += 1
+            missed = int(-delay // self.period)
+            self.skipped_ticks += missed
+            self.next_deadline += missed * self.period
+
+        tick = self.clock()
+        self.lateness = max(0.0, tick - self.next_deadline)
+        if self.last_tick is not None:
+            self.period_jitter = (tick - self.last_tick) - self.period
+        self.last_tick = tick
+        self.next_deadline += self.period
+        return tick
+
+    def get_period(self):
+        return self.period
+
+    def get_overruns(self):
+        return self.overruns
+
+    def get_skipped_ticks(self):
+        return self.skipped_ticks
+
+    def get_lateness(self):
+        return self.lateness
+
+    def get_period_jitter(self):
+        return self.period_jitter
@@ -19,16 +19,21 @@
 """
 
 from bcc import BPF
+from .cgroup_cache import CgroupCache
+from .cgroup_cache import kernel_supports_cgroup_id
 import os
 import json
 
 class DiskCollector:
-    def __init__(self, monitor_disk, monitor_file):
+    def __init__(self, monitor_disk, monitor_file, container_cache=None):
         self.monitor_file = monitor_file
         self.monitor_disk = monitor_disk
         self.disk_sample = None
         self.disk_monitor = None
-        self.proc_path = "/host/proc"
+        self.container_cache = container_cache
+        if self.container_cache is None:
+            self.container_cache = CgroupCache()
+        self.proc_path = self.container_cache.get_proc_path()
         self.proc_files = [f for f in os.listdir(self.proc_path) if os.path.isfile(os.path.join(self.proc_path, f))]
         self.number_files_to_keep = 10
 
@@ -36,7 +41,10 @@ class DiskCollector:
         bpf_code_path = os.path.dirname(os.path.abspath(__file__)) \
                         + "/../bpf/vfs_monitor.c"
         #DNAME_INLINE_LEN = 32  # linux/dcache.h
-        self.disk_monitor = BPF(src_file=bpf_code_path, cflags=["-DNAME_INLINE_LEN=%d" % 32])
+        cflags = ["-DNAME_INLINE_LEN=%d" % 32]
+        if kernel_supports_cgroup_id():
+            cflags.append("-DCGROUP_ID")
+        self.disk_monitor = BPF(src_file=bpf_code_path, cflags=cflags)
         self.disk_monitor.attach_kprobe(event="vfs_read", fn_name="trace_rw_entry")
         self.disk_monitor.attach_kretprobe(event="vfs_read", fn_name="trace_read_return")
 
@@ -69,37 +77,15 @@ class DiskCollector:
                 disk_dict[key] = {}
                 disk_dict[key]["kb_r"] = int(v.bytes_r/1000)
                 disk_dict[key]["kb_w"] = int(v.bytes_w/1000)
+                disk_dict[key]["bytes_r"] = int(v.bytes_r)
+                disk_dict[key]["bytes_w"] = int(v.bytes_w)
                 disk_dict[key]["num_r"] = int(v.num_r)
                 disk_dict[key]["num_w"] = int(v.num_w)
                 disk_dict[key]["avg_lat"] = float(v.sum_ts_deltas) / 1000 / (v.num_r+v.num_w)
                 disk_dict[key]["container_ID"] = "---others---"
-                if (os.path.exists(os.path.join(self.proc_path,str(v.pid),"cgroup"))):
-                    try:
-                        with open(os.path.join(self.proc_path, str(v.pid), 'cgroup'), 'r') as f:
-                            for line in f:
-                                line_array = line.split("/")
-                                if len(line_array) > 1 and \
-                                    len(line_array[len(line_array) -1]) == 65:
-                                    disk_dict[key]["container_ID"] = line_array[len(line_array) -1][:-1]
-                                    break
-                    except IOError:
-                        continue
-                    # systemd Docker
-                    try:
-                        with open(os.path.join(self.proc_path, str(v.pid), 'cgroup'), 'r') as f:
-                            for line in f:
-                                line_array = line.split("/")
-                                if len(line_array) > 1 \
-                                    and "docker-" in line_array[len(line_array) -1] \
-                                    and ".scope" in line_array[len(line_array) -1]:
-
-                                    new_id = line_array[len(line_array) -1].replace("docker-", "")
-                                    new_id = new_id.replace(".scope", "")
-                                    if len(new_id) == 65:
-                                        disk_dict[key]["container_ID"] = new_id
-                                        break
-                    except IOError:
-                        continue
+                container_id = self.container_cache.get_container_id(key, cgroup_id=v.cgroup_id)
+                if container_id is not None:
+                    disk_dict[key]["container_ID"] = container_id
 
             disk_dict =  self._aggregate_metrics_by_container(disk_dict)
             disk_counts.clear()
@@ -128,6 +114,34 @@ class DiskCollector:
         aggregate_dict['disk_sample'] = disk_dict
         return aggregate_dict
 
+    def merge_samples(self, older, newer):
+        # sum of two consecutive samples, used when a read missed its tick
+        disk_dict = newer["disk_sample"]
+        for key, old in older["disk_sample"].items():
+            new = disk_dict.get(key)
+            if new is None:
+                disk_dict[key] = old
+                continue
+            old_ops = old["num_r"] + old["num_w"]
+            new_ops = new["num_r"] + new["num_w"]
+            if old_ops + new_ops > 0:
+                new["avg_lat"] = (old["avg_lat"] * old_ops + new["avg_lat"] * new_ops) / (old_ops + new_ops)
+            for field in ["kb_r", "kb_w", "bytes_r", "bytes_w", "num_r", "num_w"]:
+                new[field] += old[field]
+            new["pids"] = list(set(new["pids"]) | set(old["pids"]))
+
+        file_dict = newer["file_sample"]
+        for key, old in older["file_sample"].items():
+            new = file_dict.get(key)
+            if new is None:
+                file_dict[key] = old
+                continue
+            new.set_kb_r(new.get_kb_r() + old.get_kb_r())
+            new.set_kb_w(new.get_kb_w() + old.get_kb_w())
+            new.set_num_r(new.get_num_r() + old.get_num_r())
+            new.set_num_w(new.get_num_w() + old.get_num_w())
+        return newer
+
     def _aggregate_metrics_by_container(self, disk_sample):
         container_dict = dict()
         for pid in disk_sample:
@@ -137,15 +151,18 @@ class DiskCollector:
                 container_dict[shortened_ID]["full_ID"] = disk_sample[pid]["container_ID"]
                 container_dict[shortened_ID]["kb_r"] = 0
                 container_dict[shortened_ID]["kb_w"] = 0
+                container_dict[shortened_ID]["bytes_r"] = 0
+                container_dict[shortened_ID]["bytes_w"] = 0
                 container_dict[shortened_ID]["num_r"] = 0
                 container_dict[shortened_ID]["num_w"] = 0
                 container_dict[shortened_ID]["avg_lat"] = 0
                 container_dict[shortened_ID]["pids"] = []
             container_dict[shortened_ID]["kb_r"] += disk_sample[pid]["kb_r"]
             container_dict[shortened_ID]["kb_w"] += disk_sample[pid]["kb_w"]
+            container_dict[shortened_ID]["bytes_r"] += disk_sample[pid]["bytes_r"]
+            container_dict[shortened_ID]["bytes_w"] += disk_sample[pid]["bytes_w"]
             container_dict[shortened_ID]["num_r"] += disk_sample[pid]["num_r"]
             container_dict[shortened_ID]["num_w"] += disk_sample[pid]["num_w"]
-            container_dict[shortened_ID]["num_w"] += disk_sample[pid]["num_w"]
             container_dict[shortened_ID]["avg_lat"] += disk_sample[pid]["avg_lat"]
             container_dict[shortened_ID]["pids"].append(pid)
         for k,v in container_dict.items():
@@ -0,0 +1,95 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import deque
+import threading
+import sys
+
+DROP_POLICIES = ["drop_oldest", "block"]
+
+
+class ExportQueue:
+    """
+    Bounded queue between the sampling loop and the exporter thread.
+
+    When the queue is full put() either discards the oldest queued sample
+    (drop_oldest) or waits for the exporter to make room (block). The
+    exporter runs the export callback on each queued item in order.
+    """
+
+    def __init__(self, export_fn, maxsize=16, drop_policy="drop_oldest"):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown export drop policy: {drop_policy}")
+        self.export_fn = export_fn
+        self.maxsize = max(1, int(maxsize))
+        self.drop_policy = drop_policy
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.thread = None
+
+    def get_depth(self):
+        with self.condition:
+            return len(self.items)
+
+    def get_maxsize(self):
+        return self.maxsize
+
+    def get_drop_policy(self):
+        return self.drop_policy
+
+    def get_dropped(self):
+        with self.condition:
+            return self.dropped
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self._export_loop, name="exporter", daemon=True
+            )
+            self.thread.start()
+
+    def put(self, item):
+        with self.condition:
+            if self.drop_policy == "block":
+                while len(self.items) >= self.maxsize:
+                    self.condition.wait()
+            elif len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify_all()
+
+    def get(self):
+        with self.condition:
+            while not self.items:
+                self.condition.wait()
+            item = self.items.popleft()
+            # wake up a producer blocked on a full queue
+            self.condition.notify_all()
+            return item
+
+    def _export_loop(self):
+        while True:
+            item = self.get()
+            try:
+                self.export_fn(*item)
+            except Exception as e:
+                print(f"Export failed: {e}", file=sys.stderr)
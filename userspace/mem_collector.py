@@ -19,14 +19,69 @@
 """
 
 import os
+import sys
+import time
+from .cgroup_cache import CgroupCache
+from .cgroup_cache import parse_container_id
+
+# cgroup: container level accounting from the memory cgroup
+# pss: cgroup accounting plus PSS/USS of the processes of the containers
+#      matching the container regex
+# process: RSS/PSS/USS of every process on the host from smaps
+MEMORY_MODES = ["cgroup", "pss", "process"]
 
 class MemCollector:
-    def __init__ (self):
+    def __init__ (
+        self,
+        container_cache=None,
+        memory_mode="cgroup",
+        container_pattern=None,
+        container_metadata=None,
+        v1_cgroup_paths=("/host/sys/fs/cgroup/memory", "/sys/fs/cgroup/memory"),
+        rescan_interval=5.0,
+    ):
         self.mem_dictionary = dict()
-        self.proc_path = "/host/proc"
+        self.container_cache = container_cache
+        if self.container_cache is None:
+            self.container_cache = CgroupCache()
+        self.proc_path = self.container_cache.get_proc_path()
+
+        self.memory_mode = memory_mode
+        self.container_pattern = container_pattern
+        self.container_metadata = container_metadata
+
+        # cgroup v2 exposes memory.current in the unified hierarchy, v1 the
+        # usage of the memory controller
+        self.cgroup_root = self.container_cache.get_cgroup_path()
+        self.usage_file = "memory.current"
+        self.rss_keys = ["anon"]
+        if self.cgroup_root is None:
+            self.usage_file = "memory.usage_in_bytes"
+            self.rss_keys = ["total_rss", "rss"]
+            for path in v1_cgroup_paths:
+                if os.path.isdir(path):
+                    self.cgroup_root = path
+                    break
+        if self.cgroup_root is None and self.memory_mode != "process":
+            print(
+                "Memory cgroup not found, reading memory metrics per process",
+                file=sys.stderr,
+            )
+            self.memory_mode = "process"
+
+        # container id -> cgroup directory
+        self.container_cgroups = {}
+        self.rescan_interval = rescan_interval
+        self.last_scan = 0
+
+    def get_memory_mode(self):
+        return self.memory_mode
 
     def get_mem_dictionary(self):
-        self.mem_dictionary = self._aggregate_mem_metrics(self._get_sample())
+        if self.memory_mode == "process":
+            self.mem_dictionary = self._aggregate_mem_metrics(self._get_sample())
+        else:
+            self.mem_dictionary = self._get_cgroup_sample()
         return self.mem_dictionary
 
     def _get_pid_list(self):
@@ -53,64 +108,152 @@ class MemCollector:
     def _get_sample(self):
         pid_dict = dict()
         for pid in self._get_pid_list():
-            pid_dict[pid] = {}
-            pid_dict[pid]["RSS"] = 0
-            pid_dict[pid]["USS"] = 0
-            pid_dict[pid]["PSS"] = 0
+            smaps = self._read_smaps(pid)
+            if smaps is None:
+                continue
+            pid_dict[pid] = smaps
             pid_dict[pid]["container_ID"] = "---others---"
-            #USS and PSS from smaps_rollup
-            if (os.path.exists(os.path.join(self.proc_path,str(pid),"smaps_rollup"))):
-                try:
-                    with open(os.path.join(self.proc_path,str(pid),"smaps_rollup"),"r") as f:
-                        for line in f:
-                            s = line.replace(" ","").replace("\n","").split(':')
-                            if (s[0] == "Rss"):
-                                pid_dict[pid]["RSS"] = int(s[1][:-2])
-                            elif (s[0] == "Pss"):
-                                pid_dict[pid]["PSS"] = int(s[1][:-2])
-                            elif (s[0] == "Private_Clean" or s[0] == "Private_Dirty" or s[0] == "Private_Hugetlb"):
-                                pid_dict[pid]["USS"] += int(s[1][:-2])
-                except IOError:
-                    continue
-            #USS and PSS from smaps when smaps_rollup isn't in proc
-            else:
-                try:
-                    with open(os.path.join(self.proc_path,str(pid),"smaps"),"r") as f:
-                        for line in f:
-                            s = line.replace(" ","").replace("\n","").split(':')
-                            if (s[0] == "Pss"):
-                                pid_dict[pid]["RSS"] += int(s[1][:-2])
-                            elif (s[0] == "Pss"):
-                                pid_dict[pid]["PSS"] += int(s[1][:-2])
-                            elif (s[0] == "Private_Clean" or s[0] == "Private_Dirty" or s[0] == "Private_Hugetlb"):
-                                pid_dict[pid]["USS"] += int(s[1][:-2])
-                except IOError:
-                    continue
             #assign container ID from proc
-            if (os.path.exists(os.path.join(self.proc_path,str(pid),"cgroup"))):
-                try:
-                    with open(os.path.join(self.proc_path, str(pid), 'cgroup'), 'r') as f:
-                        for line in f:
-                            line_array = line.split("/")
-                            if len(line_array) > 1 and \
-                                len(line_array[len(line_array) -1]) == 65:
-                                pid_dict[pid]["container_ID"] = line_array[len(line_array) -1][:-1]
-                except IOError:
-                    continue
-                # systemd Docker
+            container_id = self.container_cache.get_container_id(pid)
+            if container_id is not None:
+                pid_dict[pid]["container_ID"] = container_id
+
+        return pid_dict
+
+    def _read_smaps(self, pid):
+        mem = {"RSS": 0, "PSS": 0, "USS": 0}
+        #USS and PSS from smaps_rollup
+        if (os.path.exists(os.path.join(self.proc_path,str(pid),"smaps_rollup"))):
+            try:
+                with open(os.path.join(self.proc_path,str(pid),"smaps_rollup"),"r") as f:
+                    for line in f:
+                        s = line.replace(" ","").replace("\n","").split(':')
+                        if (s[0] == "Rss"):
+                            mem["RSS"] = int(s[1][:-2])
+                        elif (s[0] == "Pss"):
+                            mem["PSS"] = int(s[1][:-2])
+                        elif (s[0] == "Private_Clean" or s[0] == "Private_Dirty" or s[0] == "Private_Hugetlb"):
+                            mem["USS"] += int(s[1][:-2])
+            except IOError:
+                return None
+        #USS and PSS from smaps when smaps_rollup isn't in proc
+        else:
+            try:
+                with open(os.path.join(self.proc_path,str(pid),"smaps"),"r") as f:
+                    for line in f:
+                        s = line.replace(" ","").replace("\n","").split(':')
+                        if (s[0] == "Rss"):
+                            mem["RSS"] += int(s[1][:-2])
+                        elif (s[0] == "Pss"):
+                            mem["PSS"] += int(s[1][:-2])
+                        elif (s[0] == "Private_Clean" or s[0] == "Private_Dirty" or s[0] == "Private_Hugetlb"):
+                            mem["USS"] += int(s[1][:-2])
+            except IOError:
+                return None
+        return mem
+
+    def _get_cgroup_sample(self):
+        if time.monotonic() - self.last_scan >= self.rescan_interval:
+            self._scan_cgroups()
+
+        container_dict = dict()
+        for container_id, path in list(self.container_cgroups.items()):
+            usage = self._read_usage(path)
+            if usage is None:
+                # container stopped, its cgroup is gone
+                del self.container_cgroups[container_id]
+                continue
+            stat = self._read_stat(path)
+            rss = 0
+            for key in self.rss_keys:
+                if key in stat:
+                    rss = stat[key]
+                    break
+
+            shortened_ID = container_id[:12]
+            container_dict[shortened_ID] = {}
+            container_dict[shortened_ID]["full_ID"] = container_id
+            # kB, as the values read from smaps
+            container_dict[shortened_ID]["usage"] = usage // 1024
+            container_dict[shortened_ID]["RSS"] = rss // 1024
+            # PSS and USS are None when they are not measured
+            container_dict[shortened_ID]["PSS"] = None
+            container_dict[shortened_ID]["USS"] = None
+            container_dict[shortened_ID]["pids"] = []
+
+            if self.memory_mode == "pss" and self._is_monitored(shortened_ID):
+                container_dict[shortened_ID]["PSS"] = 0
+                container_dict[shortened_ID]["USS"] = 0
+                for pid in self._read_cgroup_pids(path):
+                    smaps = self._read_smaps(pid)
+                    if smaps is None:
+                        continue
+                    container_dict[shortened_ID]["PSS"] += smaps["PSS"]
+                    container_dict[shortened_ID]["USS"] += smaps["USS"]
+                    container_dict[shortened_ID]["pids"].append(pid)
+
+        return container_dict
+
+    def _is_monitored(self, container_id):
+        if self.container_pattern is None:
+            return True
+        if self.container_metadata is None:
+            return False
+        metadata = self.container_metadata.get(container_id)
+        return metadata is not None and bool(self.container_pattern.match(metadata.name))
+
+    def _scan_cgroups(self):
+        # containers are the first cgroups named after a container id, their
+        # memory accounting already includes the nested cgroups
+        container_cgroups = {}
+        stack = [self.cgroup_root]
+        while stack:
+            path = stack.pop()
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+            for entry in entries:
                 try:
-                    with open(os.path.join(self.proc_path, str(pid), 'cgroup'), 'r') as f:
-                        for line in f:
-                            line_array = line.split("/")
-                            if len(line_array) > 1 \
-                                and "docker-" in line_array[len(line_array) -1] \
-                                and ".scope" in line_array[len(line_array) -1]:
-
-                                new_id = line_array[len(line_array) -1].replace("docker-", "")
-                                new_id = new_id.replace(".scope", "")
-                                if len(new_id) == 65:
-                                    pid_dict[pid]["container_ID"] = new_id
-                except IOError:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                except OSError:
                     continue
+                container_id = parse_container_id(entry.name)
+                if container_id is not None:
+                    container_cgroups[container_id] = entry.path
+                else:
+                    stack.append(entry.path)
+        self.container_cgroups = container_cgroups
+        self.last_scan = time.monotonic()
 
-        return pid_dict
+    def _read_usage(self, path):
+        try:
+            with open(os.path.join(path, self.usage_file), "r") as f:
+                return int(f.read())
+        except (IOError, ValueError):
+            return None
+
+    def _read_stat(self, path):
+        stat = {}
+        try:
+            with open(os.path.join(path, "memory.stat"), "r") as f:
+                for line in f:
+                    key, _, value = line.partition(" ")
+                    stat[key] = int(value)
+        except (IOError, ValueError):
+            pass
+        return stat
+
+    def _read_cgroup_pids(self, path):
+        # processes of the container cgroup and of the nested ones
+        pids = []
+        for root, _, files in os.walk(path):
+            if "cgroup.procs" not in files:
+                continue
+            try:
+                with open(os.path.join(root, "cgroup.procs"), "r") as f:
+                    pids.extend(int(line) for line in f if line.strip())
+            except (IOError, ValueError):
+                continue
+        return pids
@@ -25,36 +25,39 @@ from .process_table import ProcTable
 from .net_collector import NetCollector
 from .mem_collector import MemCollector
 from .disk_collector import DiskCollector
+from .cgroup_cache import CgroupCache
+from .container_metadata import DockerMetadataCache
+from .container_downsampler import ContainerDownsampler
+from .deadline_scheduler import DeadlineScheduler
+from .collector_pool import CollectorPool
+from .export_queue import ExportQueue
+from .csv_writer import ContainerCsvWriter
+from .parquet_writer import ContainerParquetWriter
+from .ndjson_writer import NdjsonWriter
+from .timeseries_store import TimeSeriesStore
+from .query_server import QueryServer
+from .sinks import OUTPUT_FORMATS
+from .sinks import SampleBatch
+from .sinks import SinkPipeline
+from .sinks import PrometheusSink
+from .sinks import JsonSink
+from .sinks import NdjsonSink
+from .sinks import CsvSink
+from .sinks import ParquetSink
+from .sinks import RollupSink
+from .rollup import RollupWriter
+from .rollup import parse_rollup_tiers
+from .prometheus_exporter import ContainerMetricsCollector
 from .rapl.rapl import RaplMonitor
-import time
+from collections import OrderedDict
 import pprint
-import csv
-import json
-import os
 import re
 import prometheus_client as prom
+import sys
 
-seen_nxf_containers = set()
-nxf_counter = 0
-
-# Prometheus metrics
-CONTAINER_METRICS = [
-    ("container_cpu_usage", "CPU usage per container"),
-    ("container_cycles", "Cycles per container"),
-    ("container_weighted_cycles", "Weighted cycles per container"),
-    ("container_instruction_retired", "Instructions retired per container"),
-    ("container_cache_misses", "Cache misses per container"),
-    ("container_cache_refs", "Cache references per container"),
-    ("container_power", "Power usage per container"),
-    ("container_mem_rss", "Resident Set Size memory per container"),
-    ("container_mem_pss", "Proportional Set Size memory per container"),
-    ("container_mem_uss", "Unique Set Size memory per container"),
-    ("container_kb_r", "Kilobytes read per container"),
-    ("container_kb_w", "Kilobytes written per container"),
-    ("container_num_reads", "Number of reads per container"),
-    ("container_num_writes", "Number of writes per container"),
-    ("container_disk_avg_lat", "Average disk latency per container"),
-]
+# seconds a container is remembered for the nextflow task count after its
+# last sample. Container ids are not reused, a stopped task never comes back
+SEEN_CONTAINER_TTL = 3600
 
 
 class MonitorMain:
@@ -72,6 +75,19 @@ class MonitorMain:
         memory_measure,
         disk_measure,
         file_measure,
+        eviction_timeout=30,
+        tracepoint_mode="auto",
+        frequency=1,
+        export_queue_size=16,
+        export_drop_policy="drop_oldest",
+        series_grace_period=60,
+        max_series=15000,
+        parquet_roll_interval=3600,
+        parquet_max_rows=1000000,
+        store_retention=300,
+        query_port=0,
+        rollup_tiers="",
+        memory_mode="cgroup",
     ):
         self.output_format = output_format
         self.container_regex = container_regex
@@ -79,14 +95,36 @@ class MonitorMain:
             re.compile(container_regex) if container_regex else None
         )
 
-        # TODO: Don't hardcode the frequency
-        self.frequency = 1
+        # sampling frequency in Hz. Above 1 Hz container samples are also
+        # aggregated in 1 s windows by the downsampler
+        self.frequency = float(frequency)
+        self.downsampler = None
+        if self.frequency > 1:
+            self.downsampler = ContainerDownsampler(self.frequency)
         self.window_mode = window_mode
 
         self.topology = ProcTopology()
-        self.collector = BpfCollector(self.topology, debug_mode, power_measure)
-        self.sample_controller = SampleController(self.topology.get_hyperthread_count())
-        self.process_table = ProcTable()
+        # pid -> container resolution shared by all the collectors
+        self.container_cache = CgroupCache()
+        self.collector = BpfCollector(
+            self.topology,
+            debug_mode,
+            power_measure,
+            self.container_cache,
+            tracepoint_mode,
+        )
+        # above 1 Hz the dynamic window is capped at the loop period, cpu
+        # usage and power are computed over the tick they are reported in
+        max_timeslice = None
+        if self.frequency > 1:
+            max_timeslice = int(1000000000 / self.frequency)
+        self.sample_controller = SampleController(
+            self.topology.get_hyperthread_count(), max_timeslice
+        )
+        self.container_metadata = DockerMetadataCache()
+        self.process_table = ProcTable(
+            self.container_cache, self.container_metadata, eviction_timeout
+        )
         self.rapl_monitor = RaplMonitor(self.topology)
         self.started = False
 
@@ -106,13 +144,62 @@ class MonitorMain:
             self.net_collector = NetCollector(
                 trace_nat=nat_trace,
                 dynamic_tcp_client_port_masking=dynamic_tcp_client_port_masking,
+                container_cache=self.container_cache,
             )
 
         if self.mem_measure:
-            self.mem_collector = MemCollector()
+            self.mem_collector = MemCollector(
+                self.container_cache,
+                memory_mode,
+                self.container_pattern,
+                self.container_metadata,
+            )
 
         if self.disk_measure or self.file_measure:
-            self.disk_collector = DiskCollector(disk_measure, file_measure)
+            self.disk_collector = DiskCollector(
+                disk_measure, file_measure, self.container_cache
+            )
+
+        # memory, disk and network are collected while the bpf sample is
+        # decoded, a slow collector cannot delay the tick by more than half
+        # a period
+        self.collector_pool = CollectorPool(timeout=0.5 / self.frequency)
+        # disk and net report deltas, a late read is merged into the next one
+        if self.disk_collector:
+            self.collector_pool.set_merge("disk", self.disk_collector.merge_samples)
+        if self.net_collector:
+            self.collector_pool.set_merge("net", self.net_collector.merge_samples)
+
+        # exports run on a background thread, a slow output cannot stretch
+        # the sampling period
+        self.export_queue = ExportQueue(
+            self._export, export_queue_size, export_drop_policy
+        )
+        # recent history kept in memory and served locally, only when a
+        # query port is given
+        self.timeseries_store = None
+        self.query_server = None
+        if query_port:
+            self.timeseries_store = TimeSeriesStore(store_retention, self.frequency)
+            self.query_server = QueryServer(self.timeseries_store, int(query_port))
+
+        self.series_grace_period = series_grace_period
+        self.max_series = max_series
+        # Debug prints for counting nextflow containers
+        self.nxf_counter = 0
+        # container id -> time of its last sample, least recent first
+        self.seen_nxf_containers = OrderedDict()
+
+        # comma separated list of outputs, e.g. "prometheus,csv"
+        self.output_formats = [
+            name.strip() for name in str(output_format).split(",") if name.strip()
+        ]
+        self.container_metrics = None
+        # base directory -> buffered csv writer
+        self.csv_writers = {}
+        self.pipeline, self.fine_pipeline = self._build_pipelines(
+            parquet_roll_interval, parquet_max_rows, rollup_tiers
+        )
 
     def get_window_mode(self):
         return self.window_mode
@@ -134,13 +221,20 @@ class MonitorMain:
             if self.disk_measure or self.file_measure:
                 self.disk_collector.start_capture()
         else:
-            print("Please provide a window mode")
+            print("Please provide a window mode", file=sys.stderr)
 
     def get_sample(self):
         if not self.started:
             self._start_bpf_program(self.window_mode)
             self.started = True
 
+        if self.mem_collector:
+            self.collector_pool.submit("mem", self.mem_collector.get_mem_dictionary)
+        if self.disk_measure or self.file_measure:
+            self.collector_pool.submit("disk", self.disk_collector.get_sample)
+        if self.net_monitor:
+            self.collector_pool.submit("net", self.net_collector.get_sample)
+
         sample = self.collector.get_new_sample(
             self.sample_controller, self.rapl_monitor
         )
@@ -153,17 +247,20 @@ class MonitorMain:
         file_dict = {}
 
         if self.mem_collector:
-            mem_dict = self.mem_collector.get_mem_dictionary()
+            mem_dict = self.collector_pool.get_result("mem")
         if self.disk_measure or self.file_measure:
-            aggregate_disk_sample = self.disk_collector.get_sample()
-            if self.disk_collector:
-                disk_dict = aggregate_disk_sample["disk_sample"]
-            if self.file_measure:
-                file_dict = aggregate_disk_sample["file_sample"]
+            aggregate_disk_sample = self.collector_pool.get_result("disk")
+            if aggregate_disk_sample:
+                if self.disk_collector:
+                    disk_dict = aggregate_disk_sample["disk_sample"]
+                if self.file_measure:
+                    file_dict = aggregate_disk_sample["file_sample"]
 
         nat_data = []
+        net_sample = None
         if self.net_monitor:
-            net_sample = self.net_collector.get_sample()
+            net_sample = self.collector_pool.get_result("net")
+        if net_sample:
             self.process_table.add_process_from_sample(
                 sample,
                 net_dictionary=net_sample.get_pid_dictionary(),
@@ -174,311 +271,221 @@ class MonitorMain:
 
         # Now, extract containers!
         container_list = self.process_table.get_container_dictionary(
-            mem_dict, disk_dict
+            mem_dict, disk_dict, sample.get_interval()
         )
 
         return [
             sample,
             container_list,
-            self.process_table.get_proc_table(),
+            self.process_table,
             nat_data,
             file_dict,
         ]
 
-    def write_container_metrics_csv(self, container_list, base_dir="/output"):
-        """
-        Writes container metrics to CSV files in a nested folder structure.
-        Each container ID gets its own folder.
-        Each metric (except container_id and container_name) gets its own subfolder.
-        Each metric subfolder contains a CSV file with time series entries.
-        """
-        os.makedirs(base_dir, exist_ok=True)
-        for container_id, value in container_list.items():
-            if not container_list:
-                return
-            container_name = getattr(value, "container_name", "")
-            if not isinstance(container_name, str):
-                container_name = str(container_name)
-            # if self.container_pattern and self.container_pattern.match(container_name):
-            container_dir = os.path.join(base_dir, str(container_id))
-            os.makedirs(container_dir, exist_ok=True)
-        # Convert to dict if needed
-            if hasattr(value, "to_json"):
-                data = value.to_json()
-                if isinstance(data, str):
-                    data = json.loads(data)
-            elif isinstance(value, dict):
-                data = value
-            # else:
-            #     continue
-
-            for metric, metric_value in data.items():
-                if metric in ("container_id", "container_name"):
-                    continue
-                metric_dir = os.path.join(container_dir, metric)
-                os.makedirs(metric_dir, exist_ok=True)
-                csv_path = os.path.join(metric_dir, "timeseries.csv")
-                # Check if file exists and is non-empty
-                file_exists = os.path.exists(csv_path)
-                file_empty = not file_exists or os.path.getsize(csv_path) == 0
-                with open(csv_path, "a", newline="") as csvfile:
-                    writer = csv.writer(csvfile)
-                    if file_empty:
-                        writer.writerow(["timestamp", "container_name", "value"])
-                    writer.writerow(
-                        [int(time.time()), data.get("container_name", ""), metric_value]
-                    )
+    def _build_pipelines(self, parquet_roll_interval, parquet_max_rows, rollup_tiers):
+        pipeline = SinkPipeline()
+        # fine grained samples above 1 Hz only go to csv or the rollup tiers
+        fine_pipeline = SinkPipeline()
 
-    def log2prometheus(self, container_list, container_metrics):
-        """
-        Convert container list to Prometheus metrics.
-        This function is called to update the Prometheus metrics with the latest container data.
-        """
-
-        metric_names = [
-            "container_cpu_usage",
-            "container_cycles",
-            "container_weighted_cycles",
-            "container_instruction_retired",
-            "container_cache_misses",
-            "container_cache_refs",
-            "container_power",
-            "container_mem_rss",
-            "container_mem_pss",
-            "container_mem_uss",
-            "container_kb_r",
-            "container_kb_w",
-            "container_num_reads",
-            "container_num_writes",
-            "container_disk_avg_lat",
-        ]
+        for output_format in self.output_formats:
+            if output_format not in OUTPUT_FORMATS:
+                print(f"Unknown output format: {output_format}", file=sys.stderr)
 
-        try:
-            for key, value in container_list.items():
-                container_name = getattr(value, "container_name", "")
-                # print("fProcessing container {container_name}")
-                if not isinstance(container_name, str):
-                    container_name = str(container_name)
-                cpu_usage = float(getattr(value, "cpu_usage", 0) or 0)
-                cycles = float(getattr(value, "cycles", 0) or 0)
-                weighted_cycles = float(getattr(value, "weighted_cycles", 0) or 0)
-                instruction_retired = float(
-                    getattr(value, "instruction_retired", 0) or 0
-                )
-                cache_misses = float(getattr(value, "cache_misses", 0) or 0)
-                cache_refs = float(getattr(value, "cache_refs", 0) or 0)
-                power = float(getattr(value, "power", 0) or 0)
-                mem_RSS = float(getattr(value, "mem_RSS", 0) or 0)
-                mem_PSS = float(getattr(value, "mem_PSS", 0) or 0)
-                mem_USS = float(getattr(value, "mem_USS", 0) or 0)
-                kb_r = float(getattr(value, "kb_r", 0) or 0)
-                kb_w = float(getattr(value, "kb_w", 0) or 0)
-                num_reads = float(getattr(value, "num_r", 0) or 0)
-                num_writes = float(getattr(value, "num_w", 0) or 0)
-                disk_avg_lat = float(getattr(value, "disk_avg_lat", 0) or 0)
-
-                container_metrics["container_cpu_usage"].labels(container_id=key, name=container_name).set(
-                    cpu_usage
-                )
-                container_metrics["container_cycles"].labels(container_id=key, name=container_name).set(
-                    cycles
-                )
-                container_metrics["container_weighted_cycles"].labels(
-                    container_id=key, name=container_name
-                ).set(weighted_cycles)
-                container_metrics["container_instruction_retired"].labels(
-                    container_id=key, name=container_name, 
-                ).set(instruction_retired)
-                container_metrics["container_cache_misses"].labels(
-                    container_id=key, name=container_name
-                ).set(cache_misses)
-                container_metrics["container_cache_refs"].labels(container_id=key, name=container_name).set(
-                    cache_refs
-                )
-                container_metrics["container_power"].labels(container_id=key, name=container_name).set(power)
-                container_metrics["container_mem_rss"].labels(container_id=key, name=container_name).set(
-                    mem_RSS
-                )
-                container_metrics["container_mem_pss"].labels(container_id=key, name=container_name).set(
-                    mem_PSS
+        if "prometheus" in self.output_formats:
+            self.container_metrics = ContainerMetricsCollector(
+                self.series_grace_period, self.max_series
+            )
+            pipeline.add_sink(PrometheusSink(self.container_metrics))
+        if "json" in self.output_formats:
+            pipeline.add_sink(JsonSink())
+        if "ndjson" in self.output_formats:
+            pipeline.add_sink(NdjsonSink(NdjsonWriter()))
+        if "csv" in self.output_formats or "all_csv" in self.output_formats:
+            # all_csv writes every container, a superset of csv
+            matching_only = "all_csv" not in self.output_formats
+            if rollup_tiers:
+                # samples are rolled up in tiers of decreasing resolution
+                # instead of being kept forever. Above 1 Hz the tiers are
+                # computed from the fine samples, no raw file is written
+                rollup_sink = RollupSink(
+                    RollupWriter(parse_rollup_tiers(rollup_tiers)), matching_only
                 )
-                container_metrics["container_mem_uss"].labels(container_id=key, name=container_name).set(
-                    mem_USS
+                if self.downsampler is not None:
+                    fine_pipeline.add_sink(rollup_sink)
+                else:
+                    pipeline.add_sink(rollup_sink)
+            else:
+                pipeline.add_sink(
+                    CsvSink(self._get_csv_writer("/output"), matching_only)
                 )
-                container_metrics["container_kb_r"].labels(container_id=key, name=container_name).set(kb_r)
-                container_metrics["container_kb_w"].labels(container_id=key, name=container_name).set(kb_w)
-                container_metrics["container_num_reads"].labels(container_id=key, name=container_name).set(
-                    num_reads
+                fine_pipeline.add_sink(
+                    CsvSink(self._get_csv_writer("/output/fine"), matching_only)
                 )
-                container_metrics["container_num_writes"].labels(container_id=key, name=container_name).set(
-                    num_writes
+        elif rollup_tiers:
+            print(
+                "Rollup tiers only apply to the csv and all_csv outputs",
+                file=sys.stderr,
+            )
+        if "parquet" in self.output_formats:
+            pipeline.add_sink(
+                ParquetSink(
+                    ContainerParquetWriter(
+                        roll_interval=parquet_roll_interval, max_rows=parquet_max_rows
+                    )
                 )
-                container_metrics["container_disk_avg_lat"].labels(
-                    container_id=key, name=container_name
-                ).set(disk_avg_lat)
-
-            return metric_names
-        except Exception as e:
-            print(f"Failed to update Prometheus metrics for container {key}: {e}")
-            return []
+            )
+        return pipeline, fine_pipeline
+
+    def _get_csv_writer(self, base_dir):
+        writer = self.csv_writers.get(base_dir)
+        if writer is None:
+            writer = ContainerCsvWriter(base_dir)
+            self.csv_writers[base_dir] = writer
+        return writer
+
+    def _mark_seen(self, container_id, timestamp):
+        # returns True the first time a container is seen
+        first = container_id not in self.seen_nxf_containers
+        self.seen_nxf_containers[container_id] = timestamp
+        self.seen_nxf_containers.move_to_end(container_id)
+        return first
+
+    def _expire_seen(self, timestamp):
+        # containers without samples for SEEN_CONTAINER_TTL have stopped
+        while self.seen_nxf_containers:
+            container_id, last_seen = next(iter(self.seen_nxf_containers.items()))
+            if last_seen + SEEN_CONTAINER_TTL >= timestamp:
+                break
+            self.seen_nxf_containers.popitem(last=False)
+
+    def _export_batch(self, batch):
+        self._count_tasks(batch)
+        self.pipeline.write(batch)
+
+        if "json" in self.output_formats:
+            print(f"Nextflow unique task count: {self.nxf_counter}")
+            print("Caught Containers:")
+            pprint.pprint(list(self.seen_nxf_containers))
+
+    def _count_tasks(self, batch):
+        for index in batch.matching_indices:
+            if self._mark_seen(batch.container_ids[index], batch.timestamp):
+                self.nxf_counter += 1
+        self._expire_seen(batch.timestamp)
+
+    def _export(self, granularity, container_list, timestamp):
+        # runs on the exporter thread. The sample is flattened once for the
+        # store and every sink
+        batch = SampleBatch(container_list, timestamp, self.container_pattern)
+        if self.timeseries_store is not None and (
+            granularity == "fine" or self.downsampler is None
+        ):
+            # the store keeps the full sampling resolution
+            self.timeseries_store.add(batch)
+        if granularity == "fine":
+            self.fine_pipeline.write(batch)
+        else:
+            self._export_batch(batch)
 
     def monitor_loop(self):
-        if self.output_format == "prometheus":
+        prometheus = self.container_metrics is not None
+        if prometheus:
             prom.start_http_server(8000)
-            print("Prometheus metrics server started on port 8000")
-            print("Initializing Prometheus metrics")
+            print("Prometheus metrics server started on port 8000", file=sys.stderr)
+            print("Initializing Prometheus metrics", file=sys.stderr)
             # Define Prometheus metrics
-            container_metrics = {
-                name: prom.Gauge(name, desc, ["container_id", "name"])
-                for name, desc in CONTAINER_METRICS
-            }
+            prom.REGISTRY.register(self.container_metrics)
+            sampling_overruns = prom.Counter(
+                "deepmon_sampling_overruns", "Sampling ticks that missed their deadline"
+            )
+            sampling_skipped_ticks = prom.Counter(
+                "deepmon_sampling_skipped_ticks", "Sampling ticks skipped after an overrun"
+            )
+            sampling_period_jitter = prom.Gauge(
+                "deepmon_sampling_period_jitter_seconds",
+                "Difference between the last sampling period and the nominal one",
+            )
+            sampling_lateness = prom.Gauge(
+                "deepmon_sampling_lateness_seconds",
+                "Delay of the last sampling tick w.r.t. its deadline",
+            )
+            export_queue_depth = prom.Gauge(
+                "deepmon_export_queue_depth", "Samples waiting to be exported"
+            )
+            export_dropped = prom.Counter(
+                "deepmon_export_dropped_samples",
+                "Samples dropped because the export queue was full",
+            )
+            epoch_late_cpus = prom.Counter(
+                "deepmon_epoch_late_cpus",
+                "CPUs that did not acknowledge the selector swap in time",
+            )
 
-        # Debug prints for counting nextflow containers
-        nxf_counter = 0
+        self.export_queue.start()
+        if self.query_server is not None:
+            self.query_server.start()
+            print(
+                f"Query server started on port {self.query_server.get_port()}",
+                file=sys.stderr,
+            )
 
-        # Setting the monitoring interval
-        time_to_sleep = 1 / self.frequency
+        # Ticks are scheduled on absolute deadlines, the sampling time does
+        # not stretch the period
+        scheduler = DeadlineScheduler(1 / self.frequency)
+        overruns = 0
+        skipped_ticks = 0
+        dropped = 0
 
         while True:
-            if time_to_sleep > 0:
-                time.sleep(time_to_sleep)
-            start_time = time.time()
+            scheduler.wait()
+            if prometheus:
+                sampling_overruns.inc(scheduler.get_overruns() - overruns)
+                sampling_skipped_ticks.inc(scheduler.get_skipped_ticks() - skipped_ticks)
+                sampling_period_jitter.set(scheduler.get_period_jitter())
+                sampling_lateness.set(scheduler.get_lateness())
+                export_queue_depth.set(self.export_queue.get_depth())
+                export_dropped.inc(self.export_queue.get_dropped() - dropped)
+            else:
+                if scheduler.get_overruns() > overruns:
+                    print(
+                        f"Sampling overran its deadline, "
+                        f"{scheduler.get_skipped_ticks() - skipped_ticks} ticks skipped",
+                        file=sys.stderr,
+                    )
+                if self.export_queue.get_dropped() > dropped:
+                    print(
+                        f"Export queue full, "
+                        f"{self.export_queue.get_dropped() - dropped} samples dropped",
+                        file=sys.stderr,
+                    )
+            overruns = scheduler.get_overruns()
+            skipped_ticks = scheduler.get_skipped_ticks()
+            dropped = self.export_queue.get_dropped()
+
             sample_array = self.get_sample()
             container_list = sample_array[1]
+            timestamp = sample_array[0].get_wall_time()
 
-            if self.output_format == "prometheus":
+            # per cpu values of late cpus may mix the two windows
+            late_cpus = sample_array[0].get_late_cpus()
+            if late_cpus > 0:
+                if prometheus:
+                    epoch_late_cpus.inc(late_cpus)
                 print(
-                    f"Exporting metrics to Prometheus at {time.strftime('%Y-%m-%d %H:%M:%S')}"
+                    f"{late_cpus} cpus missed the epoch handshake, "
+                    f"their sample may be torn",
+                    file=sys.stderr,
+                )
+
+            if self.downsampler:
+                # fine grained samples only go to csv and the store, every
+                # other output uses the 1 s aggregate
+                if self.fine_pipeline.get_sinks() or self.timeseries_store is not None:
+                    self.export_queue.put(("fine", container_list, timestamp))
+                container_list = self.downsampler.add(
+                    container_list, sample_array[0].get_interval(), timestamp
                 )
-                try:
-                    found = False
-                    if container_list:
-                        matching_container_list = {
-                            key: value
-                            for key, value in container_list.items()
-                            if self.container_pattern.match(
-                                getattr(value, "container_name", "")
-                            )
-                        }
-                        for key, value in matching_container_list.items():
-                            container_name = getattr(value, "container_name", "")
-                            if not isinstance(container_name, str):
-                                container_name = str(container_name)
-                            if self.container_pattern and self.container_pattern.match(
-                                container_name
-                            ):
-                                print(f"Container {key} name matches: {container_name}")
-                                found = True
-                                if key not in seen_nxf_containers:
-                                    seen_nxf_containers.add(key)
-                                    nxf_counter += 1
-                                if not value:
-                                    print(f"ALARM Container {key} has no metrics.")
-                                # else:
-                                #     print(f"Writing metrics to csv for container {container_name}")
-                                #     self.write_container_metrics_csv({key: value})
-                            print(f"Sending metrics to prometheus for container {container_name}")
-                        self.log2prometheus(matching_container_list, container_metrics)
-                        print(f"Nextflow unique task count: {nxf_counter}")
-                    else:
-                        print("No containers found in this sample.")
-                except AttributeError as e:
-                    print(f"AttributeError: {e}")
-                except Exception as e:
-                    print(f"Unexpected error: {e}")
-
-            if self.output_format == "json":
-                try:
-                    # Print global/sample-level power and timing info ONCE
-                    # print("Sample (global) stats:")
-                    # print(sample.get_log_json())
-
-                    # Then print each container's info
-                    found = False
-                    if container_list:
-                        for key, value in container_list.items():
-                            container_name = getattr(value, "container_name", "")
-                            if self.container_pattern and self.container_pattern.match(
-                                container_name
-                            ):
-                                found = True
-                                if key not in seen_nxf_containers:
-                                    seen_nxf_containers.add(key)
-                                    nxf_counter += 1
-                                    print(
-                                        f"Container ID {key} name matches: {container_name}"
-                                    )
-                                    continue
-                                if hasattr(value, "to_json"):
-                                    print(value.to_json())
-                                else:
-                                    print(str(value))
-                        if not found:
-                            print("No nextflow container found yet.")
-                        print(f"Nextflow unique task count: {nxf_counter}")
-                        print("Caught Containers:")
-                        pprint.pprint(seen_nxf_containers)
-                    else:
-                        print("No containers found in this sample.")
-                except AttributeError as e:
-                    print(f"AttributeError: {e}")
-                except Exception as e:
-                    print(f"Unexpected error: {e}")
-
-            if self.output_format == "csv":
-                try:
-                    found = False
-                    if container_list:
-                        for key, value in container_list.items():
-                            container_name = getattr(value, "container_name", "")
-                            cpu_usage = getattr(value, "cpu_usage", 0)
-                            if not isinstance(container_name, str):
-                                container_name = str(container_name)
-                            if self.container_pattern and self.container_pattern.match(
-                                container_name
-                            ):
-                                found = True
-                                if key not in seen_nxf_containers:
-                                    seen_nxf_containers.add(key)
-                                    nxf_counter += 1
-                                    print(
-                                        f"Container ID {key} name matches: {container_name}"
-                                    )
-                                    # continue
-                                if not value:
-                                    print(f"ALARM Container {key} has no metrics.")
-                                else:
-                                    # continue
-                                    # print(f"Writing metrics for container {key} with values {value.to_json()}")
-                                # print(value.to_json())
-                                    # self.write_container_metrics_csv(container_list)
-                                    self.write_container_metrics_csv({key: value})
-                                    # print(value.to_json())
-                                    # print(f"DEBUG Caught Containers with name: {container_name} and example metric: {cpu_usage}")
-                        # if not found:
-                            # print("No nextflow container found yet.")
-                        # print(f"Nextflow unique task count: {nxf_counter}")
-                        # pprint.pprint(seen_nxf_containers)
-                    else:
-                        print("No containers found in this sample.")
-                except AttributeError as e:
-                    print(f"AttributeError: {e}")
-                except Exception as e:
-                    print(f"Unexpected error: {e}")
-
-            if self.output_format == "all_csv":
-                try:
-                    if container_list:
-                        for key, value in container_list.items():
-                            container_name = getattr(value, "container_name", "")
-                            if not value:
-                                print(f"ALARM Container {key} has no metrics.")
-                            else:
-                                self.write_container_metrics_csv({key: value})
-                    else:
-                        print("No containers found in this sample.")
-                except AttributeError as e:
-                    print(f"AttributeError: {e}")
-                except Exception as e:
-                    print(f"Unexpected error: {e}")
-            print(f"Sampling loop duration: {time.time() - start_time:.2f} seconds")
+                if container_list is None:
+                    continue
+
+            self.export_queue.put(("window", container_list, timestamp))
@@ -0,0 +1,87 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from .csv_writer import CONTAINER_FIELDS
+import json
+import sys
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _to_builtin(value):
+    # NumPy scalars and sets left in the container records
+    if hasattr(value, "item"):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class NdjsonWriter:
+    """
+    Streams container records as newline delimited JSON.
+
+    Every container of a sample becomes one compact line with the sample
+    time and the metrics in CONTAINER_FIELDS, the whole sample is sent
+    with a single write. orjson is used when installed.
+    """
+
+    def __init__(self, stream=None):
+        if stream is None:
+            stream = sys.stdout
+        self.stream = stream
+        # orjson produces bytes, write them to the underlying binary buffer
+        self.binary = orjson is not None and hasattr(stream, "buffer")
+
+    def write(self, batch, indices):
+        records = []
+        for index in indices:
+            record = {
+                "timestamp": batch.timestamp,
+                "container_id": batch.container_ids[index],
+                "container_name": batch.container_names[index],
+            }
+            record.update(zip(CONTAINER_FIELDS, batch.rows[index]))
+            records.append(record)
+        if not records:
+            return
+
+        if self.binary:
+            payload = b"\n".join(
+                orjson.dumps(
+                    record,
+                    default=_to_builtin,
+                    option=orjson.OPT_SERIALIZE_NUMPY,
+                )
+                for record in records
+            )
+            self.stream.flush()
+            self.stream.buffer.write(payload + b"\n")
+            self.stream.buffer.flush()
+        else:
+            payload = "\n".join(
+                json.dumps(record, separators=(",", ":"), default=_to_builtin)
+                for record in records
+            )
+            self.stream.write(payload + "\n")
+            self.stream.flush()
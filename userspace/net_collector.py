@@ -26,9 +26,12 @@ from struct import pack
 from collections import namedtuple
 import os
 from ddsketch.ddsketch import DDSketch
+from .cgroup_cache import CgroupCache
+from .cgroup_cache import kernel_supports_cgroup_id
 
 
 from enum import Enum
+import sys
 
 HTTPSessionKey = namedtuple('HTTPSession', ['saddr', 'lport', 'daddr', 'dport', 'path'])
 TCPSessionKey = namedtuple('TCPSession', ['saddr', 'lport', 'daddr', 'dport'])
@@ -111,6 +114,7 @@ class TransactionData:
         self.p99_999 = 0
         self.http_path = ""
         self.samples = []
+        self.container_id = None
 
     def load_latencies(self, latency_sketch, total_time, transaction_count):
         self.samples = latency_sketch
@@ -127,6 +131,12 @@ class TransactionData:
     def load_http_path(self, path):
         self.http_path = path
 
+    def set_container_id(self, container_id):
+        self.container_id = container_id
+
+    def get_container_id(self):
+        return self.container_id
+
     def get_type(self):
         return self.type
 
@@ -308,10 +318,13 @@ class NetSample:
 
 class NetCollector:
 
-    def __init__(self, trace_nat=False, dynamic_tcp_client_port_masking=False):
+    def __init__(self, trace_nat=False, dynamic_tcp_client_port_masking=False, container_cache=None):
         self.ebpf_tcp_monitor = None
         self.nat = trace_nat
         self.dynamic_tcp_client_port_masking = dynamic_tcp_client_port_masking
+        self.container_cache = container_cache
+        if self.container_cache is None:
+            self.container_cache = CgroupCache()
 
         # define hash tables, skip endpoints and connections for now
         # as they self manage and self clean in eBPF code
@@ -352,6 +365,8 @@ class NetCollector:
         if self.dynamic_tcp_client_port_masking:
             cflags.append("-DDYN_TCP_CLIENT_PORT_MASKING")
             cflags.append("-DDYN_TCP_CLIENT_PORT_MASKING_THRESHOLD=%d" % self.tcp_dyn_masking_threshold)
+        if kernel_supports_cgroup_id():
+            cflags.append("-DCGROUP_ID")
 
         # print(cflags)
 
@@ -458,6 +473,10 @@ class NetCollector:
                     if transaction_type == TransactionType.ipv4_http or transaction_type == TransactionType.ipv6_http:
                         data_item.load_http_path(str(key.http_payload))
 
+                    # resolve the container from the cgroup id recorded in eBPF
+                    if value.cgroup_id:
+                        data_item.set_container_id(self.container_cache.get_container_id(None, cgroup_id=int(value.cgroup_id)))
+
                     # sum up host metrics
                     host_transaction_count = host_transaction_count + int(value.transaction_count)
                     host_byte_tx = host_byte_tx + int(value.byte_tx)
@@ -488,14 +507,14 @@ class NetCollector:
             self.ipv4_http_summary[old_selector].clear()
             self.ipv6_http_summary[old_selector].clear()
         except Exception as e:
-            print(e)
+            print(e, file=sys.stderr)
             # try to clean rewritten rules as for each packet the useful nat rules
             # are rewritten inside the tables automatically
         try:
             self.rewritten_rules.clear()
             self.rewritten_rules_6.clear()
         except Exception as e:
-            print(e)
+            print(e, file=sys.stderr)
 
         try:
             # clear also reservoir hashmaps
@@ -504,6 +523,23 @@ class NetCollector:
             self.ipv4_http_latency[old_selector].clear()
             self.ipv6_http_latency[old_selector].clear()
         except Exception as e:
-            print(e)
+            print(e, file=sys.stderr)
 
         return NetSample(pid_dict, nat_dict, nat_list, host_transaction_count, host_byte_tx, host_byte_rx)
+
+    def merge_samples(self, older, newer):
+        # sum of two consecutive samples, used when a read missed its tick
+        pid_dict = {k: list(v) for k, v in older.get_pid_dictionary().items()}
+        for k, v in newer.get_pid_dictionary().items():
+            pid_dict.setdefault(k, []).extend(v)
+        nat_dict = {k: list(v) for k, v in older.get_nat_dictionary().items()}
+        for k, v in newer.get_nat_dictionary().items():
+            nat_dict.setdefault(k, []).extend(v)
+        return NetSample(
+            pid_dict,
+            nat_dict,
+            older.get_nat_list() + newer.get_nat_list(),
+            older.get_host_transaction_count() + newer.get_host_transaction_count(),
+            older.get_host_byte_tx() + newer.get_host_byte_tx(),
+            older.get_host_byte_rx() + newer.get_host_byte_rx(),
+        )
@@ -0,0 +1,156 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from .csv_writer import CONTAINER_FIELDS
+from .csv_writer import FLOAT_FIELDS
+import atexit
+import os
+import threading
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+def _get_schema():
+    fields = [
+        pa.field("timestamp", pa.timestamp("ms", tz="UTC")),
+        pa.field("container_id", pa.dictionary(pa.int32(), pa.string())),
+        pa.field("container_name", pa.dictionary(pa.int32(), pa.string())),
+    ]
+    for field in CONTAINER_FIELDS:
+        if field in FLOAT_FIELDS:
+            fields.append(pa.field(field, pa.float64()))
+        else:
+            fields.append(pa.field(field, pa.int64()))
+    return pa.schema(fields)
+
+
+class ContainerParquetWriter:
+    """
+    Appends container samples to Arrow record batches and rolls them into
+    Parquet files under base_dir.
+
+    Each sample becomes a record batch, batches are written as a row group
+    once row_group_rows rows are buffered. A new file is started every
+    roll_interval seconds or after max_rows rows. Container ids and names
+    are dictionary encoded, so they cost a few bytes per row.
+    """
+
+    def __init__(
+        self,
+        base_dir="/output/parquet",
+        roll_interval=3600,
+        max_rows=1000000,
+        row_group_rows=65536,
+        clock=time.monotonic,
+    ):
+        if pa is None:
+            raise ImportError("pyarrow is required for the parquet output")
+        self.base_dir = base_dir
+        self.roll_interval = float(roll_interval)
+        self.max_rows = int(max_rows)
+        self.row_group_rows = int(row_group_rows)
+        self.clock = clock
+        self.schema = _get_schema()
+
+        self.writer = None
+        self.file_path = None
+        self.file_start = 0
+        self.file_rows = 0
+        self.batches = []
+        self.buffered_rows = 0
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def get_file_path(self):
+        return self.file_path
+
+    def write(self, batch, indices):
+        indices = list(indices)
+        if not indices:
+            return
+        record_batch = self._to_record_batch(batch, indices)
+        with self.lock:
+            if self.writer is not None and (
+                self.clock() - self.file_start >= self.roll_interval
+                or self.file_rows + self.buffered_rows >= self.max_rows
+            ):
+                self._roll()
+            if self.writer is None:
+                self._open(batch.timestamp)
+            self.batches.append(record_batch)
+            self.buffered_rows += record_batch.num_rows
+            if self.buffered_rows >= self.row_group_rows:
+                self._write_row_group()
+
+    def close(self):
+        with self.lock:
+            self._roll()
+
+    def _to_record_batch(self, batch, indices):
+        ids = [str(batch.container_ids[i]) for i in indices]
+        names = [batch.container_names[i] for i in indices]
+        # transpose the rows of the batch into columns
+        columns = zip(*(batch.rows[i] for i in indices))
+
+        arrays = [
+            pa.array([int(batch.timestamp * 1000)] * len(ids), pa.int64()).cast(
+                self.schema.field("timestamp").type
+            ),
+            pa.array(ids, pa.string()).dictionary_encode(),
+            pa.array(names, pa.string()).dictionary_encode(),
+        ]
+        for field, column in zip(CONTAINER_FIELDS, columns):
+            arrays.append(pa.array(column, self.schema.field(field).type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def _open(self, timestamp):
+        os.makedirs(self.base_dir, exist_ok=True)
+        name = time.strftime("containers-%Y%m%d-%H%M%S", time.gmtime(timestamp))
+        self.file_path = os.path.join(self.base_dir, name + ".parquet")
+        suffix = 0
+        while os.path.exists(self.file_path):
+            # rolled on size within the same second
+            suffix += 1
+            self.file_path = os.path.join(self.base_dir, f"{name}-{suffix}.parquet")
+        self.writer = pq.ParquetWriter(self.file_path, self.schema)
+        self.file_start = self.clock()
+        self.file_rows = 0
+
+    def _write_row_group(self):
+        if not self.batches:
+            return
+        self.writer.write_table(pa.Table.from_batches(self.batches, self.schema))
+        self.file_rows += self.buffered_rows
+        self.batches = []
+        self.buffered_rows = 0
+
+    def _roll(self):
+        # the file footer is written on close, only closed files are readable
+        if self.writer is None:
+            return
+        self._write_row_group()
+        self.writer.close()
+        self.writer = None
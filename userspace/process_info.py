@@ -30,6 +30,7 @@ class BpfPidStatus(ct.Structure):
         ("pid", ct.c_int),
         ("tgid", ct.c_int),
         ("comm", ct.c_char * TASK_COMM_LEN),
+        ("cgroup_id", ct.c_ulonglong),
         ("weighted_cycles", ct.c_ulonglong * 2 * socket_size),
         ("cycles", ct.c_ulonglong * 2),
         ("instruction_retired", ct.c_ulonglong * 2),
@@ -18,298 +18,440 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-import docker
 from .process_info import ProcessInfo
-
-# from .bpf_collector import BpfSample
+from .process_info import SocketProcessItem
 from .container_info import ContainerInfo
-import os
+from .cgroup_cache import CgroupCache
+from .container_metadata import DockerMetadataCache
+import heapq
+import numpy as np
+
+TASK_COMM_LEN = 16
+
+COUNTER_COLUMNS = [
+    "cycles",
+    "instruction_retired",
+    "cache_misses",
+    "cache_refs",
+    "time_ns",
+]
+
+# cumulative per container counters, they survive the processes that
+# contributed to them. They restart from zero once all the processes of
+# the container have been evicted (eviction_timeout without samples)
+TOTAL_FIELDS = [
+    "energy_joules",
+    "cycles",
+    "instructions",
+    "bytes_r",
+    "bytes_w",
+    "num_r",
+    "num_w",
+]
 
 
 class ProcTable:
-    def __init__(self):
-        self.proc_table = {}
-        self.docker_client = docker.from_env()
+    """
+    Cumulative table of the processes running in containers.
 
-    # remove processes that did not receive updates in the last 8 seconds
-    def reset_metrics_and_evict_stale_processes(self, ts):
-        evicted_keys = []
+    Processes are stored as a structure of arrays: every process owns a slot
+    and each metric is a NumPy column indexed by slot. Container level
+    metrics are computed with one reduction per column, so the aggregation
+    cost does not depend on the number of threads.
+    """
+
+    def __init__(
+        self,
+        container_cache=None,
+        container_metadata=None,
+        eviction_timeout=30,
+        capacity=4096,
+    ):
+        self.container_cache = container_cache
+        if self.container_cache is None:
+            self.container_cache = CgroupCache()
+        self.container_metadata = container_metadata
+        if self.container_metadata is None:
+            self.container_metadata = DockerMetadataCache()
+
+        self.capacity = 0
+        self.num_sockets = 0
+        # pid -> slot and the list of slots not in use
+        self.slots = {}
+        self.free_slots = []
+
+        # container index -> container id, index -1 marks a free slot
+        self.container_ids = []
+        self.container_index = {}
+
+        # min-heap of (last_ts, slot, pid) ordered by expiration. Entries are
+        # not updated when a process is sampled again, they are checked and
+        # pushed back with the current last_ts only once they expire
+        self.eviction_timeout = int(float(eviction_timeout) * 1000000000)
+        self.eviction_heap = []
+
+        # container id -> cumulative counters
+        self.container_totals = {}
+
+        # network data is sparse, keep it out of the columns
+        self.network_transactions = {}
+        self.nat_rules = {}
+        # transactions of pids without a slot, by short container id
+        self.container_transactions = {}
+
+        self.pid = np.zeros(0, dtype=np.int64)
+        self.tgid = np.zeros(0, dtype=np.int64)
+        self.comm = np.zeros(0, dtype="S%d" % TASK_COMM_LEN)
+        self.cgroup_id = np.zeros(0, dtype=object)
+        self.container = np.full(0, -1, dtype=np.int64)
+        self.counters = {}
+        for column in COUNTER_COLUMNS:
+            self.counters[column] = np.zeros(0, dtype=np.uint64)
+        self.weighted_cycles = np.zeros((0, 0), dtype=np.uint64)
+        self.socket_ts = np.zeros(0, dtype=np.uint64)
+        self.power = np.zeros(0, dtype=np.float64)
+        self.cpu_usage = np.zeros(0, dtype=np.float64)
+        self.last_ts = np.zeros(0, dtype=np.uint64)
+        self._grow(capacity)
+
+    def _grow(self, capacity, num_sockets=None):
+        if num_sockets is None:
+            num_sockets = self.num_sockets
+        old_capacity = self.capacity
 
-        for proc_table_key, proc_table_value in self.proc_table.items():
-            # if proc_table_value.get_last_ts() + 8000000000 < ts:
-            if proc_table_value.get_last_ts() + 30000000000 < ts:
-                evicted_keys.append(proc_table_key)
+        def extend(column, fill=0):
+            shape = (capacity,) + column.shape[1:]
+            new_column = np.full(shape, fill, dtype=column.dtype)
+            new_column[:old_capacity] = column
+            return new_column
+
+        self.pid = extend(self.pid)
+        self.tgid = extend(self.tgid)
+        self.comm = extend(self.comm, b"")
+        self.cgroup_id = extend(self.cgroup_id, "")
+        self.container = extend(self.container, -1)
+        for column in COUNTER_COLUMNS:
+            self.counters[column] = extend(self.counters[column])
+        self.socket_ts = extend(self.socket_ts)
+        self.power = extend(self.power)
+        self.cpu_usage = extend(self.cpu_usage)
+        self.last_ts = extend(self.last_ts)
+
+        weighted_cycles = np.zeros((capacity, num_sockets), dtype=np.uint64)
+        weighted_cycles[:old_capacity, : self.num_sockets] = self.weighted_cycles
+        self.weighted_cycles = weighted_cycles
+
+        # hand out low slots first
+        self.free_slots.extend(range(capacity - 1, old_capacity - 1, -1))
+        self.capacity = capacity
+        self.num_sockets = num_sockets
+
+    def _allocate_slot(self, pid):
+        if not self.free_slots:
+            self._grow(max(self.capacity * 2, 1))
+        slot = self.free_slots.pop()
+        self.slots[pid] = slot
+        return slot
+
+    def _free_slot(self, pid):
+        slot = self.slots.pop(pid)
+        self.container[slot] = -1
+        self._reset_slots(slot)
+        self.last_ts[slot] = 0
+        self.free_slots.append(slot)
+        self.network_transactions.pop(pid, None)
+        self.nat_rules.pop(pid, None)
+
+    def _reset_slots(self, slots):
+        for column in COUNTER_COLUMNS:
+            self.counters[column][slots] = 0
+        self.weighted_cycles[slots] = 0
+        self.socket_ts[slots] = 0
+        self.power[slots] = 0
+        self.cpu_usage[slots] = 0
+
+    def _get_container_index(self, container_id):
+        index = self.container_index.get(container_id)
+        if index is None:
+            index = len(self.container_ids)
+            self.container_ids.append(container_id)
+            self.container_index[container_id] = index
+        return index
+
+    def _compact_containers(self):
+        # renumber the containers that still own slots
+        live = self.container >= 0
+        used, remapped = np.unique(self.container[live], return_inverse=True)
+        self.container[live] = remapped
+        self.container_ids = [self.container_ids[index] for index in used.tolist()]
+        self.container_index = {
+            container_id: index for index, container_id in enumerate(self.container_ids)
+        }
+
+    def get_eviction_timeout(self):
+        return self.eviction_timeout
+
+    def set_eviction_timeout(self, eviction_timeout):
+        self.eviction_timeout = int(float(eviction_timeout) * 1000000000)
+
+    # remove processes that did not receive updates in the last
+    # eviction_timeout seconds
+    def reset_metrics_and_evict_stale_processes(self, ts):
+        heap = self.eviction_heap
+        while heap and heap[0][0] + self.eviction_timeout < ts:
+            _, slot, pid = heapq.heappop(heap)
+            if self.slots.get(pid) != slot:
+                # process already evicted or replaced
+                continue
+            last_ts = int(self.last_ts[slot])
+            if last_ts + self.eviction_timeout < ts:
+                self._free_slot(pid)
             else:
-                proc_table_value.set_power(0)
-                proc_table_value.set_cpu_usage(0)
-                proc_table_value.reset_data()
+                heapq.heappush(heap, (last_ts, slot, pid))
 
-        # remove evicted keys
-        for k in evicted_keys:
-            self.proc_table.pop(k, None)
+        # replaced processes leave stale entries behind, rebuild the heap
+        # when they outnumber the live ones
+        if len(heap) > 2 * len(self.slots) + 1024:
+            self.eviction_heap = [
+                (int(self.last_ts[slot]), slot, pid) for pid, slot in self.slots.items()
+            ]
+            heapq.heapify(self.eviction_heap)
+
+        self._reset_slots(self.container >= 0)
+        self.network_transactions = {}
+        self.nat_rules = {}
+        self.container_transactions = {}
+
+        if len(self.container_ids) > 2 * max(len(self.slots), 1):
+            self._compact_containers()
 
     def add_process(self, proc_info):
-        self.proc_table[proc_info.get_pid()] = proc_info
+        pid = proc_info.get_pid()
+        if pid in self.slots:
+            self._free_slot(pid)
+        slot = self._allocate_slot(pid)
+        self._set_identity(
+            slot,
+            pid,
+            proc_info.get_tgid(),
+            proc_info.get_comm(),
+            proc_info.get_cgroup_id(),
+            proc_info.get_container_id(),
+        )
+        self.counters["cycles"][slot] = proc_info.get_cycles()
+        self.counters["instruction_retired"][slot] = proc_info.get_instruction_retired()
+        self.counters["cache_misses"][slot] = proc_info.get_cache_misses()
+        self.counters["cache_refs"][slot] = proc_info.get_cache_refs()
+        self.counters["time_ns"][slot] = proc_info.get_time_ns()
+        self.power[slot] = proc_info.get_power()
+        self.cpu_usage[slot] = proc_info.get_cpu_usage()
+        socket_data = proc_info.get_socket_data()
+        if len(socket_data) > self.num_sockets:
+            self._grow(self.capacity, len(socket_data))
+        for socket, item in enumerate(socket_data):
+            self.weighted_cycles[slot, socket] = item.get_weighted_cycles()
+        self.socket_ts[slot] = proc_info.get_last_ts()
+        self.last_ts[slot] = proc_info.get_last_ts()
+        heapq.heappush(self.eviction_heap, (proc_info.get_last_ts(), slot, pid))
+
+    def _set_identity(self, slot, pid, tgid, comm, cgroup_id, container_id):
+        self.pid[slot] = pid
+        self.tgid[slot] = tgid
+        self.comm[slot] = comm
+        self.cgroup_id[slot] = cgroup_id
+        self.container[slot] = self._get_container_index(container_id)
 
     def add_process_from_sample(self, sample, net_dictionary=None, nat_dictionary=None):
-        # print(f"DEBUG: add_process_from_sample called with {len(sample.get_pid_dict())} processes")
-        # reset counters for each entries
-        for key, value in sample.get_pid_dict().items():
-            if key in self.proc_table:
-                # process already there, check if comm is the same
-                if value.get_comm() == self.proc_table[key].get_comm():
-                    # ok, update stuff
-                    self.proc_table[key].set_power(value.get_power())
-                    self.proc_table[key].set_cpu_usage(value.get_cpu_usage())
-                    self.proc_table[key].set_instruction_retired(
-                        value.get_instruction_retired()
-                    )
-                    self.proc_table[key].set_cycles(value.get_cycles())
-                    self.proc_table[key].set_cache_misses(value.get_cache_misses())
-                    self.proc_table[key].set_cache_refs(value.get_cache_refs())
-                    self.proc_table[key].set_time_ns(value.get_time_ns())
-                    self.proc_table[key].set_socket_data_array(value.get_socket_data())
-                    # Accumulate metrics instead of overwriting
-
-                    # self.proc_table[key].set_power(
-                    #     self.proc_table[key].get_power() + value.get_power()
-                    # )
-                    # self.proc_table[key].set_cpu_usage(
-                    #     self.proc_table[key].get_cpu_usage() + value.get_cpu_usage()
-                    # )
-                    # self.proc_table[key].set_instruction_retired(
-                    #     self.proc_table[key].get_instruction_retired()
-                    #     + value.get_instruction_retired()
-                    # )
-                    # self.proc_table[key].set_cycles(
-                    #     self.proc_table[key].get_cycles() + value.get_cycles()
-                    # )
-                    # self.proc_table[key].set_cache_misses(
-                    #     self.proc_table[key].get_cache_misses()
-                    #     + value.get_cache_misses()
-                    # )
-                    # self.proc_table[key].set_cache_refs(
-                    #     self.proc_table[key].get_cache_refs() + value.get_cache_refs()
-                    # )
-                    # self.proc_table[key].set_time_ns(
-                    #     self.proc_table[key].get_time_ns() + value.get_time_ns()
-                    # )
-                    # # Optionally: merge socket data if needed
-                    # # Optionally: update last seen timestamp
-                    # self.proc_table[key].set_last_seen(sample.get_max_ts())
-                else:
-                    # process is changed, replace entry and find cgroup_id
-                    try:
-                        cgroup_id = self.find_cgroup_id(key, value.tgid)
-                        if cgroup_id is not None:
-                            value.set_cgroup_id(cgroup_id)
-                            value.set_container_id(cgroup_id[0:12])
-                            self.proc_table[key] = value
-                            # print(f"DEBUG: Added PID {value.get_pid()} with container_id: {value.container_id}")
-                    except Exception as e:
-                        # print(f"Error finding cgroup_id for key {key}: {e}")
-                        continue
-            else:
-                # new process, add it and find cgroup_id
-                try:
-                    cgroup_id = self.find_cgroup_id(key, value.tgid)
-                    if cgroup_id is not None:
-                        value.set_cgroup_id(cgroup_id)
-                        value.set_container_id(cgroup_id[0:12])
-                        self.proc_table[key] = value
-                        # print(f"DEBUG: Added PID {value.get_pid()} with container_id: {value.container_id}")
-                except Exception as e:
-                    # print(f"Error finding cgroup_id for key {key}: {e}")
+        columns = sample.get_columns()
+        keys = columns["key"].tolist()
+        if not keys:
+            return
+        weighted_cycles = columns["weighted_cycles"]
+        if weighted_cycles.shape[1] > self.num_sockets:
+            self._grow(self.capacity, weighted_cycles.shape[1])
+
+        slots = np.array([self.slots.get(key, -1) for key in keys], dtype=np.int64)
+        known = slots >= 0
+        # a known pid running a different comm is a recycled pid
+        same = np.zeros(len(keys), dtype=bool)
+        same[known] = self.comm[slots[known]] == columns["comm"][known]
+
+        # new or changed processes are added only if they run in a container
+        for row in np.flatnonzero(~same).tolist():
+            key = keys[row]
+            if key in self.slots:
+                self._free_slot(key)
+            container_id = self.container_cache.get_container_id(
+                int(columns["pid"][row]),
+                int(columns["tgid"][row]),
+                int(columns["cgroup_id"][row]),
+            )
+            if container_id is None:
+                continue
+            slot = self._allocate_slot(key)
+            self._set_identity(
+                slot,
+                int(columns["pid"][row]),
+                int(columns["tgid"][row]),
+                columns["comm"][row],
+                container_id,
+                container_id[0:12],
+            )
+            heapq.heappush(self.eviction_heap, (int(columns["ts"][row]), slot, key))
+            slots[row] = slot
+
+        rows = np.flatnonzero(slots >= 0)
+        targets = slots[rows]
+        for column in COUNTER_COLUMNS:
+            self.counters[column][targets] = columns[column][rows]
+        self.weighted_cycles[targets, : weighted_cycles.shape[1]] = weighted_cycles[rows]
+        self.socket_ts[targets] = columns["ts"][rows]
+        self.last_ts[targets] = columns["ts"][rows]
+        self.power[targets] = columns["power"][rows]
+        self.cpu_usage[targets] = columns["cpu_usage"][rows]
+
+        if net_dictionary:
+            for key, transactions in net_dictionary.items():
+                if key in self.slots:
+                    self.network_transactions[key] = transactions
                     continue
-            if net_dictionary and key in net_dictionary:
-                try:
-                    self.proc_table[key].set_network_transactions(net_dictionary[key])
-                except KeyError:
-                    pass
-
-            if nat_dictionary and key in nat_dictionary:
-                try:
-                    self.proc_table[key].set_nat_rules(nat_dictionary[key])
-                except KeyError:
-                    pass
-
-    # def add_process_from_sample(self, sample, net_dictionary=None, nat_dictionary=None):
-    #     for key, value in sample.get_pid_dict().items():
-    #         value.set_last_seen_ts(sample.get_max_ts())
-    #         if key in self.proc_table:
-    #             # process already there, check if comm is the same
-    #             if value.get_comm() == self.proc_table[key].get_comm():
-    #                 # Accumulate metrics instead of overwriting
-    #                 self.proc_table[key].set_power(
-    #                     self.proc_table[key].get_power() + value.get_power()
-    #                 )
-    #                 self.proc_table[key].set_cpu_usage(
-    #                     self.proc_table[key].get_cpu_usage() + value.get_cpu_usage()
-    #                 )
-    #                 self.proc_table[key].set_instruction_retired(
-    #                     self.proc_table[key].get_instruction_retired()
-    #                     + value.get_instruction_retired()
-    #                 )
-    #                 self.proc_table[key].set_cycles(
-    #                     self.proc_table[key].get_cycles() + value.get_cycles()
-    #                 )
-    #                 self.proc_table[key].set_cache_misses(
-    #                     self.proc_table[key].get_cache_misses()
-    #                     + value.get_cache_misses()
-    #                 )
-    #                 self.proc_table[key].set_cache_refs(
-    #                     self.proc_table[key].get_cache_refs() + value.get_cache_refs()
-    #                 )
-    #                 self.proc_table[key].set_time_ns(
-    #                     self.proc_table[key].get_time_ns() + value.get_time_ns()
-    #                 )
-    #                 # Optionally: merge socket data if needed
-    #                 self.proc_table[key].set_last_seen(sample.get_max_ts())
-    #             else:
-    #                 # process is changed, replace entry and find cgroup_id
-    #                 try:
-    #                     cgroup_id = self.find_cgroup_id(key, value.tgid)
-    #                     if cgroup_id is not None:
-    #                         value.set_cgroup_id(cgroup_id)
-    #                         value.set_container_id(cgroup_id[0:12])
-    #                         value.set_last_seen(sample.get_max_ts())
-    #                         self.proc_table[key] = value
-    #                 except Exception:
-    #                     continue
-    #         else:
-    #             # new process, add it and find cgroup_id
-    #             try:
-    #                 cgroup_id = self.find_cgroup_id(key, value.tgid)
-    #                 if cgroup_id is not None:
-    #                     value.set_cgroup_id(cgroup_id)
-    #                     value.set_container_id(cgroup_id[0:12])
-    #                     value.set_last_seen(sample.get_max_ts())
-    #                     self.proc_table[key] = value
-    #             except Exception:
-    #                 continue
-
-    #         if net_dictionary and key in net_dictionary:
-    #             try:
-    #                 self.proc_table[key].set_network_transactions(net_dictionary[key])
-    #             except KeyError:
-    #                 pass
-
-    #         if nat_dictionary and key in nat_dictionary:
-    #             try:
-    #                 self.proc_table[key].set_nat_rules(nat_dictionary[key])
-    #             except KeyError:
-    #                 pass
+                # short lived pids missing from the table are attributed
+                # by the container of the cgroup id seen in the kernel
+                for transaction in transactions:
+                    container_id = transaction.get_container_id()
+                    if container_id is not None:
+                        self.container_transactions.setdefault(
+                            container_id[0:12], []
+                        ).append(transaction)
+
+        if nat_dictionary:
+            for key, rules in nat_dictionary.items():
+                if key in self.slots:
+                    self.nat_rules[key] = rules
 
     def find_cgroup_id(self, pid, tgid):
-        # print(f"DEBUG: Looking for cgroup_id for PID {pid}, TGID {tgid}")
-        for id in [pid, tgid]:
-            # scan proc folder searching for the pid
-            for path in ["/host/proc", "/proc"]:
-                try:
-                    # Non-systemd Docker
-                    with open(os.path.join(path, str(id), "cgroup"), "r") as f:
-                        for line in f:
-                            line_array = line.split("/")
-                            if (
-                                len(line_array) > 1
-                                and len(line_array[len(line_array) - 1]) == 65
-                            ):
-                                return line_array[len(line_array) - 1]
-                except IOError:
-                    continue
+        return self.container_cache.get_container_id(pid, tgid)
 
-            for path in ["/host/proc", "/proc"]:
-                try:
-                    # systemd Docker
-                    with open(os.path.join(path, str(id), "cgroup"), "r") as f:
-                        for line in f:
-                            line_array = line.split("/")
-                            if (
-                                len(line_array) > 1
-                                and "docker-" in line_array[len(line_array) - 1]
-                                and ".scope" in line_array[len(line_array) - 1]
-                            ):
-                                new_id = line_array[len(line_array) - 1].replace(
-                                    "docker-", ""
-                                )
-                                new_id = new_id.replace(".scope", "")
-                                if len(new_id) == 65:
-                                    return new_id
-
-                except IOError:  # proc has already terminated
-                    continue
-        return None
+    def get_process_info(self, pid):
+        slot = self.slots.get(pid)
+        if slot is None:
+            return None
+        proc_info = ProcessInfo(self.num_sockets)
+        proc_info.set_pid(int(self.pid[slot]))
+        proc_info.set_tgid(int(self.tgid[slot]))
+        proc_info.set_comm(bytes(self.comm[slot]))
+        proc_info.set_cgroup_id(self.cgroup_id[slot])
+        proc_info.set_container_id(self.container_ids[self.container[slot]])
+        proc_info.set_cycles(int(self.counters["cycles"][slot]))
+        proc_info.set_instruction_retired(
+            int(self.counters["instruction_retired"][slot])
+        )
+        proc_info.set_cache_misses(int(self.counters["cache_misses"][slot]))
+        proc_info.set_cache_refs(int(self.counters["cache_refs"][slot]))
+        proc_info.set_time_ns(int(self.counters["time_ns"][slot]))
+        proc_info.set_power(self.power[slot])
+        proc_info.set_cpu_usage(self.cpu_usage[slot])
+        ts = int(self.socket_ts[slot])
+        for socket, cycles in enumerate(self.weighted_cycles[slot].tolist()):
+            proc_info.set_socket_data(socket, SocketProcessItem(cycles, ts))
+        proc_info.set_network_transactions(self.network_transactions.get(pid, []))
+        proc_info.set_nat_rules(self.nat_rules.get(pid, []))
+        return proc_info
 
     def get_proc_table(self):
-        return self.proc_table
+        # ProcessInfo view of the table, built on demand
+        proc_table = {}
+        for pid in self.slots:
+            proc_table[pid] = self.get_process_info(pid)
+        return proc_table
 
-    def get_container_dictionary(self, mem_dictionary=None, disk_dictionary=None):
-        # print("DEBUG: get_container_dictionary called")
+    def get_container_dictionary(
+        self, mem_dictionary=None, disk_dictionary=None, interval=None
+    ):
         container_dict = {}
 
-        for key, value in self.proc_table.items():
-            # print(f"DEBUG: proc_table PID {key} container_id: {value.container_id}")
-            if value.container_id:
-                if value.container_id not in container_dict:
-                    container_dict[value.container_id] = ContainerInfo(
-                        value.container_id
-                    )
-
-                    try:
-                        # retrieve info from docker
-                        container = self.docker_client.containers.get(
-                            value.container_id
-                        )
-                        # print(f"Setting name for container {value.container_id}: {container.name}")
-                        container_dict[value.container_id].set_container_name(
-                            str(container.name)
-                        )
-                        # print(f"Setting image for container {value.container_id}: {container.image}")
-                        container_dict[value.container_id].set_container_image(
-                            str(container.image)
-                        )
-                        # print(f"Setting labels for container {value.container_id}: {container.labels}")
-                        container_dict[value.container_id].set_container_labels(
-                            container.labels
-                        )
-                    except docker.errors.NotFound:
-                        # Handle the case where the container is not found gracefully
-                        continue
-
-                # print(f"Adding cycles for container {value.container_id}: {value.get_cycles()}")
-                container_dict[value.container_id].add_cycles(value.get_cycles())
-                # print(f"Adding weighted cycles for container {value.container_id}: {value.get_aggregated_weighted_cycles()}")
-                container_dict[value.container_id].add_weighted_cycles(
-                    value.get_aggregated_weighted_cycles()
-                )
-                # print(f"Adding instructions for container {value.container_id}: {value.get_instruction_retired()}")
-                container_dict[value.container_id].add_instructions(
-                    value.get_instruction_retired()
-                )
-                # print(f"Adding cache misses for container {value.container_id}: {value.get_cache_misses()}")
-                container_dict[value.container_id].add_cache_misses(
-                    value.get_cache_misses()
-                )
-                # print(f"Adding cache refs for container {value.container_id}: {value.get_cache_refs()}")
-                container_dict[value.container_id].add_cache_refs(
-                    value.get_cache_refs()
-                )
-                # print(f"Adding time_ns for container {value.container_id}: {value.get_time_ns()}")
-                container_dict[value.container_id].add_time_ns(value.get_time_ns())
-                # print(f"Adding power for container {value.container_id}: {value.get_power()}")
-                container_dict[value.container_id].add_power(value.get_power())
-                # print(f"Adding cpu usage for container {value.container_id}: {value.get_cpu_usage()}")
-                container_dict[value.container_id].add_cpu_usage(value.get_cpu_usage())
-                # print(f"Adding pid for container {value.container_id}: {value.get_pid()}")
-                container_dict[value.container_id].add_pid(value.get_pid())
-                # print(f"Setting last_ts for container {value.container_id}: {value.get_last_ts()}")
-                container_dict[value.container_id].set_last_ts(value.get_last_ts())
-                # print(f"Adding network transactions for container {value.container_id}: {value.get_network_transactions()}")
-                container_dict[value.container_id].add_network_transactions(
-                    value.get_network_transactions()
-                )
-                # print(f"Adding nat rules for container {value.container_id}: {value.get_nat_rules()}")
-                container_dict[value.container_id].add_nat_rules(value.get_nat_rules())
+        # processes are kept until eviction_timeout to preserve their
+        # identity, only the ones sampled in this interval are exported
+        live = np.flatnonzero((self.container >= 0) & (self.socket_ts > 0))
+        if len(live) == 0:
+            return container_dict
+        container = self.container[live]
+        num_containers = len(self.container_ids)
+
+        def rollup(values):
+            return np.bincount(
+                container, weights=values, minlength=num_containers
+            ).tolist()
+
+        sums = {}
+        for column in COUNTER_COLUMNS:
+            sums[column] = rollup(self.counters[column][live].astype(np.float64))
+        weighted_cycles = rollup(
+            self.weighted_cycles[live].sum(axis=1, dtype=np.float64)
+        )
+        power = rollup(self.power[live])
+        cpu_usage = rollup(self.cpu_usage[live])
+        threads = np.bincount(container, minlength=num_containers).tolist()
+
+        max_cpu_usage = np.zeros(num_containers)
+        np.maximum.at(max_cpu_usage, container, self.cpu_usage[live])
+        last_ts = np.zeros(num_containers, dtype=np.uint64)
+        np.maximum.at(last_ts, container, self.socket_ts[live])
+
+        # pids grouped by container
+        order = np.argsort(container, kind="stable")
+        grouped_pids = self.pid[live][order]
+        bounds = np.searchsorted(container[order], np.arange(num_containers + 1))
+
+        for index, container_id in enumerate(self.container_ids):
+            if threads[index] == 0:
+                continue
+            info = ContainerInfo(container_id)
+
+            # metadata are retrieved from docker in background,
+            # unknown containers get their name in a later sample
+            metadata = self.container_metadata.get(container_id)
+            if metadata is not None:
+                info.set_container_name(metadata.name)
+                info.set_container_image(metadata.image)
+                info.set_container_labels(metadata.labels)
+
+            info.set_cycles(int(sums["cycles"][index]))
+            info.set_weighted_cycles(int(weighted_cycles[index]))
+            info.set_instructions(int(sums["instruction_retired"][index]))
+            info.set_cache_misses(int(sums["cache_misses"][index]))
+            info.set_cache_refs(int(sums["cache_refs"][index]))
+            info.set_time_ns(int(sums["time_ns"][index]))
+            info.set_power(power[index])
+            info.set_cpu_usage(cpu_usage[index])
+            # number of threads fully using a core as busy as the busiest one
+            if max_cpu_usage[index] > 0:
+                info.set_weighted_threads(int(cpu_usage[index] // max_cpu_usage[index]))
+            else:
+                info.set_weighted_threads(threads[index])
+            info.set_pid_set(
+                set(grouped_pids[bounds[index] : bounds[index + 1]].tolist())
+            )
+            info.set_last_ts(int(last_ts[index]))
+            container_dict[container_id] = info
+
+        for key, transactions in self.network_transactions.items():
+            slot = self.slots.get(key)
+            if slot is not None:
+                container_id = self.container_ids[self.container[slot]]
+                if container_id in container_dict:
+                    container_dict[container_id].add_network_transactions(transactions)
+
+        for container_id, transactions in self.container_transactions.items():
+            if container_id in container_dict:
+                container_dict[container_id].add_network_transactions(transactions)
+
+        for key, rules in self.nat_rules.items():
+            slot = self.slots.get(key)
+            if slot is not None:
+                container_id = self.container_ids[self.container[slot]]
+                if container_id in container_dict:
+                    container_dict[container_id].add_nat_rules(rules)
 
         # aggregate stuff at the container level
         for key, value in container_dict.items():
@@ -321,14 +463,50 @@ class ProcTable:
                     value.set_mem_RSS(mem_dictionary[key]["RSS"])
                     value.set_mem_PSS(mem_dictionary[key]["PSS"])
                     value.set_mem_USS(mem_dictionary[key]["USS"])
+                    if "usage" in mem_dictionary[key]:
+                        value.set_mem_usage(mem_dictionary[key]["usage"])
 
         if disk_dictionary:
             for key, value in container_dict.items():
                 if key in disk_dictionary:
                     value.set_disk_kb_r(disk_dictionary[key]["kb_r"])
                     value.set_disk_kb_w(disk_dictionary[key]["kb_w"])
+                    value.set_disk_bytes_r(disk_dictionary[key]["bytes_r"])
+                    value.set_disk_bytes_w(disk_dictionary[key]["bytes_w"])
                     value.set_disk_num_r(disk_dictionary[key]["num_r"])
                     value.set_disk_num_w(disk_dictionary[key]["num_w"])
                     value.set_disk_avg_lat(disk_dictionary[key]["avg_lat"])
 
+        self._accumulate_totals(container_dict, interval)
         return container_dict
+
+    def _accumulate_totals(self, container_dict, interval):
+        # interval is the measured length of the sample in seconds, power
+        # in mW
+        seconds = float(interval) if interval else 0.0
+        totals = {}
+        for container_id, value in container_dict.items():
+            total = self.container_totals.get(container_id)
+            if total is None:
+                total = dict.fromkeys(TOTAL_FIELDS, 0)
+                total["energy_joules"] = 0.0
+            total["energy_joules"] += value.power / 1000 * seconds
+            total["cycles"] += value.cycles
+            total["instructions"] += value.instruction_retired
+            total["bytes_r"] += value.bytes_r
+            total["bytes_w"] += value.bytes_w
+            total["num_r"] += value.num_r
+            total["num_w"] += value.num_w
+            totals[container_id] = total
+            # copy, exporters may read it while the next sample is added
+            value.set_totals(dict(total))
+        # idle containers keep their totals while they own processes,
+        # containers whose processes have all been evicted start over
+        for index in np.unique(self.container[self.container >= 0]).tolist():
+            container_id = self.container_ids[index]
+            if container_id not in totals and container_id in self.container_totals:
+                totals[container_id] = self.container_totals[container_id]
+        self.container_totals = totals
+
+    def get_container_totals(self):
+        return self.container_totals
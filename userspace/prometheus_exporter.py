@@ -0,0 +1,169 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+from prometheus_client.core import CounterMetricFamily
+from prometheus_client.core import GaugeMetricFamily
+import time
+
+# metric name, description, ContainerInfo attribute
+CONTAINER_METRICS = [
+    ("container_cpu_usage", "CPU usage per container", "cpu_usage"),
+    ("container_cycles", "Cycles per container", "cycles"),
+    ("container_weighted_cycles", "Weighted cycles per container", "weighted_cycles"),
+    (
+        "container_instruction_retired",
+        "Instructions retired per container",
+        "instruction_retired",
+    ),
+    ("container_cache_misses", "Cache misses per container", "cache_misses"),
+    ("container_cache_refs", "Cache references per container", "cache_refs"),
+    ("container_power", "Power usage per container", "power"),
+    ("container_mem_rss", "Resident Set Size memory per container", "mem_RSS"),
+    ("container_mem_pss", "Proportional Set Size memory per container", "mem_PSS"),
+    ("container_mem_uss", "Unique Set Size memory per container", "mem_USS"),
+    ("container_mem_usage", "Memory charged to the container cgroup", "mem_usage"),
+    ("container_kb_r", "Kilobytes read per container", "kb_r"),
+    ("container_kb_w", "Kilobytes written per container", "kb_w"),
+    ("container_num_reads", "Number of reads per container", "num_r"),
+    ("container_num_writes", "Number of writes per container", "num_w"),
+    ("container_disk_avg_lat", "Average disk latency per container", "disk_avg_lat"),
+]
+
+# metric name, description, key of ContainerInfo.totals. Exposed with the
+# _total suffix, rate() and increase() stay exact across missed scrapes.
+# Totals restart from zero when a container has been idle for longer than
+# eviction_timeout, which rate() handles as a counter reset
+CONTAINER_COUNTERS = [
+    ("container_energy_joules", "Energy consumed per container", "energy_joules"),
+    ("container_cpu_cycles", "Cycles executed per container", "cycles"),
+    ("container_instructions", "Instructions retired per container", "instructions"),
+    ("container_disk_read_bytes", "Bytes read from disk per container", "bytes_r"),
+    ("container_disk_written_bytes", "Bytes written to disk per container", "bytes_w"),
+    ("container_disk_reads", "Disk reads per container", "num_r"),
+    ("container_disk_writes", "Disk writes per container", "num_w"),
+]
+
+SERIES_PER_CONTAINER = len(CONTAINER_METRICS) + len(CONTAINER_COUNTERS)
+
+
+class ContainerMetricsCollector:
+    """
+    Prometheus collector generating the container metrics at scrape time.
+
+    update() only refreshes the set of live containers, the metric families
+    are built from the latest snapshot when Prometheus scrapes. A container
+    missing from the samples keeps its series for grace_period seconds,
+    then they are removed. At most max_series series are exported, the
+    least recently seen containers are evicted first.
+    """
+
+    def __init__(self, grace_period=60, max_series=15000, clock=time.monotonic):
+        self.grace_period = float(grace_period)
+        self.max_containers = max(1, int(max_series) // SERIES_PER_CONTAINER)
+        self.clock = clock
+        # container id -> (container info, last time seen), oldest first
+        self.containers = OrderedDict()
+        self.snapshot = ()
+        self.expired_series = 0
+        self.evicted_series = 0
+
+    def update(self, container_list):
+        now = self.clock()
+        for container_id, value in container_list.items():
+            self.containers[container_id] = (value, now)
+            self.containers.move_to_end(container_id)
+
+        # containers are ordered by last time seen, stale ones come first
+        while self.containers:
+            _, (_, last_seen) = next(iter(self.containers.items()))
+            if now - last_seen <= self.grace_period:
+                break
+            self.containers.popitem(last=False)
+            self.expired_series += SERIES_PER_CONTAINER
+        while len(self.containers) > self.max_containers:
+            self.containers.popitem(last=False)
+            self.evicted_series += SERIES_PER_CONTAINER
+
+        # tuple rebinding is atomic, a concurrent scrape sees either the
+        # old or the new snapshot
+        self.snapshot = tuple(
+            (container_id, value) for container_id, (value, _) in self.containers.items()
+        )
+
+    def get_snapshot(self):
+        return self.snapshot
+
+    def get_series_count(self):
+        return len(self.snapshot) * SERIES_PER_CONTAINER
+
+    def collect(self):
+        snapshot = self.snapshot
+        for name, description, attribute in CONTAINER_METRICS:
+            family = GaugeMetricFamily(
+                name, description, labels=["container_id", "name"]
+            )
+            for container_id, value in snapshot:
+                sample = getattr(value, attribute, 0)
+                if sample is None:
+                    # not measured for this container, no series
+                    continue
+                container_name = getattr(value, "container_name", "")
+                if not isinstance(container_name, str):
+                    container_name = str(container_name)
+                family.add_metric(
+                    [str(container_id), container_name], float(sample or 0)
+                )
+            yield family
+
+        for name, description, key in CONTAINER_COUNTERS:
+            family = CounterMetricFamily(
+                name, description, labels=["container_id", "name"]
+            )
+            for container_id, value in snapshot:
+                container_name = getattr(value, "container_name", "")
+                if not isinstance(container_name, str):
+                    container_name = str(container_name)
+                totals = getattr(value, "totals", None) or {}
+                family.add_metric(
+                    [str(container_id), container_name], float(totals.get(key, 0))
+                )
+            yield family
+
+        yield GaugeMetricFamily(
+            "deepmon_container_series",
+            "Container series currently exported",
+            value=len(snapshot) * SERIES_PER_CONTAINER,
+        )
+        yield GaugeMetricFamily(
+            "deepmon_container_series_limit",
+            "Maximum number of container series exported",
+            value=self.max_containers * SERIES_PER_CONTAINER,
+        )
+        yield CounterMetricFamily(
+            "deepmon_container_series_expired",
+            "Container series removed after their grace period",
+            value=self.expired_series,
+        )
+        yield CounterMetricFamily(
+            "deepmon_container_series_evicted",
+            "Container series evicted to stay within the series limit",
+            value=self.evicted_series,
+        )
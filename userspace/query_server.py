@@ -0,0 +1,110 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+import json
+import threading
+
+
+class QueryServer:
+    """
+    Local HTTP endpoint serving range queries from a TimeSeriesStore.
+
+    GET /containers                      container ids and names
+    GET /metrics                         names of the stored metrics
+    GET /query?container=ID&metric=M[&start=S][&end=E]
+                                         [[timestamp, value], ...] with
+                                         start/end in epoch seconds
+    """
+
+    def __init__(self, store, port, host="127.0.0.1"):
+        self.store = store
+        self.server = ThreadingHTTPServer((host, port), _QueryHandler)
+        self.server.daemon_threads = True
+        self.server.store = store
+        self.thread = None
+
+    def get_port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.server.serve_forever, name="query-server", daemon=True
+            )
+            self.thread.start()
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _QueryHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        store = self.server.store
+
+        if url.path == "/containers":
+            self._reply(200, store.get_containers())
+        elif url.path == "/metrics":
+            self._reply(200, store.get_metrics())
+        elif url.path == "/query":
+            if "container" not in params or "metric" not in params:
+                self._reply(400, {"error": "container and metric are required"})
+                return
+            try:
+                points = store.query(
+                    params["container"],
+                    params["metric"],
+                    params.get("start"),
+                    params.get("end"),
+                )
+            except KeyError:
+                self._reply(404, {"error": f"unknown metric {params['metric']}"})
+                return
+            except ValueError as e:
+                self._reply(400, {"error": str(e)})
+                return
+            self._reply(
+                200,
+                {
+                    "container": params["container"],
+                    "metric": params["metric"],
+                    "points": points,
+                },
+            )
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # one line per request would flood the monitor output
+        pass
@@ -0,0 +1,216 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from .csv_writer import CONTAINER_FIELDS
+from .csv_writer import ContainerCsvWriter
+import atexit
+import calendar
+import os
+import threading
+import time
+
+ROLLUP_AGGREGATES = ["min", "max", "mean", "sum"]
+
+ROLLUP_HEADER = ["timestamp", "container_name", "samples"] + [
+    f"{field}_{aggregate}" for field in CONTAINER_FIELDS for aggregate in ROLLUP_AGGREGATES
+]
+
+SEGMENT_NAME = "%Y%m%d-%H.csv"
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_duration(text):
+    # "10s", "5m", "1h", "7d", plain seconds. 0 means forever
+    text = text.strip().lower()
+    if text and text[-1] in _DURATION_UNITS:
+        return float(text[:-1]) * _DURATION_UNITS[text[-1]]
+    return float(text)
+
+
+def parse_rollup_tiers(spec):
+    """
+    Parses "resolution:retention,..." e.g. "1s:1h,10s:1d,60s:0" into a
+    list of (resolution, retention) pairs in seconds, finest first.
+    """
+    tiers = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        resolution, _, retention = item.partition(":")
+        resolution = parse_duration(resolution)
+        retention = parse_duration(retention or "0")
+        if resolution <= 0 or retention < 0:
+            raise ValueError(f"Invalid rollup tier: {item}")
+        tiers.append((resolution, retention))
+    return sorted(tiers)
+
+
+class _Window:
+    def __init__(self):
+        self.container_name = ""
+        self.samples = 0
+        self.mins = None
+        self.maxs = None
+        self.sums = None
+        # samples of each field, values that were not measured are None
+        self.counts = None
+
+    def add(self, container_name, row):
+        self.container_name = container_name
+        self.samples += 1
+        if self.sums is None:
+            self.mins = [None] * len(row)
+            self.maxs = [None] * len(row)
+            self.sums = [0] * len(row)
+            self.counts = [0] * len(row)
+        for index, value in enumerate(row):
+            if value is None:
+                continue
+            if self.counts[index] == 0 or value < self.mins[index]:
+                self.mins[index] = value
+            if self.counts[index] == 0 or value > self.maxs[index]:
+                self.maxs[index] = value
+            self.sums[index] += value
+            self.counts[index] += 1
+
+    def get_row(self, timestamp):
+        row = [timestamp, self.container_name, self.samples]
+        for index in range(len(self.sums)):
+            if self.counts[index] == 0:
+                row.extend([None] * len(ROLLUP_AGGREGATES))
+                continue
+            row.append(self.mins[index])
+            row.append(self.maxs[index])
+            row.append(self.sums[index] / self.counts[index])
+            row.append(self.sums[index])
+        return row
+
+
+class RollupTier:
+    """
+    Aggregates the samples of each container over windows of resolution
+    seconds, aligned on the wall clock. Rows are written to
+    <base_dir>/<container_id>/<segment>.csv, one segment per hour (per day
+    from 60 s resolution). Segments entirely older than retention seconds
+    are deleted when a new segment starts, retention 0 keeps them forever.
+    """
+
+    def __init__(self, resolution, retention, base_dir):
+        self.resolution = float(resolution)
+        self.retention = float(retention)
+        self.segment_seconds = 3600 if self.resolution < 60 else 86400
+        self.base_dir = base_dir
+        self.writer = ContainerCsvWriter(base_dir)
+        self.window_start = None
+        self.windows = {}
+        self.segment = None
+
+    def get_resolution(self):
+        return self.resolution
+
+    def get_retention(self):
+        return self.retention
+
+    def add(self, batch, indices):
+        start = batch.timestamp // self.resolution * self.resolution
+        if self.window_start is not None and start != self.window_start:
+            self._write_window()
+        self.window_start = start
+        for index in indices:
+            container_id = batch.container_ids[index]
+            window = self.windows.get(container_id)
+            if window is None:
+                window = _Window()
+                self.windows[container_id] = window
+            window.add(batch.container_names[index], batch.rows[index])
+
+    def close(self):
+        self._write_window()
+        self.writer.close()
+
+    def _write_window(self):
+        if not self.windows:
+            return
+        segment = self.window_start // self.segment_seconds * self.segment_seconds
+        if segment != self.segment:
+            # files of the previous segment are complete
+            self.writer.close()
+            self.segment = segment
+            self._expire_segments()
+        file_name = time.strftime(SEGMENT_NAME, time.gmtime(segment))
+        timestamp = round(self.window_start, 3)
+        self.writer.write_rows(
+            (
+                (container_id, window.get_row(timestamp))
+                for container_id, window in self.windows.items()
+            ),
+            file_name,
+            ROLLUP_HEADER,
+        )
+        self.windows = {}
+
+    def _expire_segments(self):
+        if self.retention <= 0 or not os.path.isdir(self.base_dir):
+            return
+        horizon = self.window_start - self.retention
+        for container_id in os.listdir(self.base_dir):
+            container_dir = os.path.join(self.base_dir, container_id)
+            if not os.path.isdir(container_dir):
+                continue
+            for file_name in os.listdir(container_dir):
+                try:
+                    start = calendar.timegm(time.strptime(file_name, SEGMENT_NAME))
+                except ValueError:
+                    continue
+                if start + self.segment_seconds <= horizon:
+                    os.remove(os.path.join(container_dir, file_name))
+            if not os.listdir(container_dir):
+                os.rmdir(container_dir)
+
+
+class RollupWriter:
+    """
+    Writes the container samples to every rollup tier, each tier under
+    <base_dir>/<resolution>s. Tiers are computed from the samples as they
+    arrive, the coarse ones do not need the fine files to be kept.
+    """
+
+    def __init__(self, tiers, base_dir="/output/rollup"):
+        self.tiers = []
+        for resolution, retention in tiers:
+            tier_dir = os.path.join(base_dir, "%gs" % resolution)
+            self.tiers.append(RollupTier(resolution, retention, tier_dir))
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def get_tiers(self):
+        return self.tiers
+
+    def write(self, batch, indices):
+        indices = list(indices)
+        with self.lock:
+            for tier in self.tiers:
+                tier.add(batch, indices)
+
+    def close(self):
+        with self.lock:
+            for tier in self.tiers:
+                tier.close()
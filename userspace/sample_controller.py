@@ -20,10 +20,13 @@
 
 class SampleController:
 
-    def __init__(self, processors):
+    def __init__(self, processors, max_timeslice=None):
         self.timeslice = 1000000000
         self.sleep_time = 1
         self.processors = processors
+        # upper bound in ns, the window cannot be longer than a loop tick
+        self.max_timeslice = max_timeslice
+        self._cap_timeslice()
 
     def compute_sleep_time(self, sched_switches):
         if sched_switches/(self.processors*self.sleep_time)< 100:
@@ -38,6 +41,12 @@ class SampleController:
         else:
             self.sleep_time = 1
             self.timeslice = 1000000000
+        self._cap_timeslice()
+
+    def _cap_timeslice(self):
+        if self.max_timeslice is not None and self.timeslice > self.max_timeslice:
+            self.timeslice = int(self.max_timeslice)
+            self.sleep_time = self.timeslice / 1000000000
 
     def get_sleep_time(self):
         return self.sleep_time
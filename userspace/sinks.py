@@ -0,0 +1,192 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from .csv_writer import CONTAINER_FIELDS
+from .csv_writer import OPTIONAL_FIELDS
+from abc import ABC
+from abc import abstractmethod
+import sys
+import time
+
+OUTPUT_FORMATS = ["prometheus", "json", "ndjson", "csv", "all_csv", "parquet"]
+
+
+class SampleBatch:
+    """
+    Container sample flattened once for all the sinks.
+
+    Names are resolved, the container regex is evaluated and the metrics
+    in CONTAINER_FIELDS are extracted a single time. rows[i] holds the
+    values of container_ids[i] in CONTAINER_FIELDS order, None for the
+    OPTIONAL_FIELDS that were not measured.
+    """
+
+    def __init__(self, container_list, timestamp=None, container_pattern=None):
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.containers = container_list or {}
+        self.container_ids = []
+        self.container_names = []
+        self.rows = []
+        self.matching = []
+        for container_id, value in self.containers.items():
+            container_name = getattr(value, "container_name", "") or ""
+            if not isinstance(container_name, str):
+                container_name = str(container_name)
+            self.container_ids.append(container_id)
+            self.container_names.append(container_name)
+            self.rows.append(
+                [
+                    getattr(value, field, None)
+                    if field in OPTIONAL_FIELDS
+                    else getattr(value, field, 0) or 0
+                    for field in CONTAINER_FIELDS
+                ]
+            )
+            self.matching.append(
+                container_pattern is None or bool(container_pattern.match(container_name))
+            )
+        self.matching_indices = [i for i, match in enumerate(self.matching) if match]
+
+    def __len__(self):
+        return len(self.container_ids)
+
+    def get_timestamp(self):
+        return self.timestamp
+
+    def get_indices(self, matching_only):
+        if matching_only:
+            return self.matching_indices
+        return range(len(self.container_ids))
+
+    def get_containers(self, matching_only):
+        return {
+            self.container_ids[i]: self.containers[self.container_ids[i]]
+            for i in self.get_indices(matching_only)
+        }
+
+
+class Sink(ABC):
+    """
+    Output consuming the sample batches. Sinks with matching_only set only
+    see the containers matching the container regex.
+    """
+
+    matching_only = True
+
+    @abstractmethod
+    def write(self, batch):
+        pass
+
+    def close(self):
+        pass
+
+
+class PrometheusSink(Sink):
+    def __init__(self, collector):
+        self.collector = collector
+
+    def write(self, batch):
+        # metric families are built from the snapshot at scrape time
+        self.collector.update(batch.get_containers(self.matching_only))
+
+
+class JsonSink(Sink):
+    def write(self, batch):
+        if not batch.matching_indices:
+            print("No nextflow container found yet.")
+        for container_id, value in batch.get_containers(self.matching_only).items():
+            if hasattr(value, "to_json"):
+                print(value.to_json())
+            else:
+                print(str(value))
+
+
+class CsvSink(Sink):
+    def __init__(self, writer, matching_only=True):
+        self.writer = writer
+        self.matching_only = matching_only
+
+    def write(self, batch):
+        self.writer.write(batch, batch.get_indices(self.matching_only))
+
+    def close(self):
+        self.writer.close()
+
+
+class RollupSink(Sink):
+    def __init__(self, writer, matching_only=True):
+        self.writer = writer
+        self.matching_only = matching_only
+
+    def write(self, batch):
+        self.writer.write(batch, batch.get_indices(self.matching_only))
+
+    def close(self):
+        self.writer.close()
+
+
+class NdjsonSink(Sink):
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, batch):
+        self.writer.write(batch, batch.get_indices(self.matching_only))
+
+
+class ParquetSink(Sink):
+    # the whole history is kept for offline analysis
+    matching_only = False
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, batch):
+        self.writer.write(batch, batch.get_indices(self.matching_only))
+
+    def close(self):
+        self.writer.close()
+
+
+class SinkPipeline:
+    """
+    Fans every sample batch out to the enabled sinks. A failing sink does
+    not prevent the others from receiving the batch.
+    """
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def get_sinks(self):
+        return self.sinks
+
+    def write(self, batch):
+        for sink in self.sinks:
+            try:
+                sink.write(batch)
+            except Exception as e:
+                # stderr, stdout may carry the ndjson stream
+                print(f"{type(sink).__name__} failed: {e}", file=sys.stderr)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,350 @@
+"""
+    DEEP-mon
+    Copyright (C) 2020  Brondolin Rolando
+
+    This file is part of DEEP-mon
+
+    DEEP-mon is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DEEP-mon is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from .csv_writer import CONTAINER_FIELDS
+from .csv_writer import FLOAT_FIELDS
+from collections import OrderedDict
+from collections import deque
+import struct
+import threading
+
+# points encoded in each chunk of a container ring
+CHUNK_POINTS = 128
+
+
+def _append_varint(buffer, value):
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varints(buffer, count):
+    values = []
+    value = 0
+    shift = 0
+    for byte in buffer:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(value)
+        if len(values) == count:
+            break
+        value = 0
+        shift = 0
+    return values
+
+
+def _zigzag(value):
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def _unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _float_bits(value):
+    return struct.unpack("<Q", struct.pack("<d", value))[0]
+
+
+def _bits_float(bits):
+    return struct.unpack("<d", struct.pack("<Q", bits))[0]
+
+
+class _BitWriter:
+    def __init__(self):
+        self.buffer = bytearray()
+        # bits not yet flushed to the buffer
+        self.pending = 0
+        self.pending_bits = 0
+
+    def write(self, value, bits):
+        self.pending = (self.pending << bits) | value
+        self.pending_bits += bits
+        while self.pending_bits >= 8:
+            self.pending_bits -= 8
+            self.buffer.append((self.pending >> self.pending_bits) & 0xFF)
+        self.pending &= (1 << self.pending_bits) - 1
+
+    def get_size(self):
+        return len(self.buffer) + (1 if self.pending_bits else 0)
+
+
+class _BitReader:
+    def __init__(self, writer):
+        self.bits = int.from_bytes(writer.buffer, "big") << writer.pending_bits
+        self.bits |= writer.pending
+        self.length = len(writer.buffer) * 8 + writer.pending_bits
+        self.position = 0
+
+    def read(self, bits):
+        self.position += bits
+        return (self.bits >> (self.length - self.position)) & ((1 << bits) - 1)
+
+
+class _XorEncoder:
+    """
+    Gorilla float encoding: a 0 bit when the value does not change,
+    otherwise 1 and the XOR with the previous value. The XOR is written as
+    0 and its meaningful bits when they fit in the window of the previous
+    XOR, or as 1, 5 bits of leading zeros, 6 bits of length and the
+    meaningful bits.
+    """
+
+    def __init__(self):
+        self.writer = _BitWriter()
+        self.previous = _float_bits(0.0)
+        self.leading = None
+        self.trailing = None
+
+    def add(self, value):
+        bits = _float_bits(float(value))
+        xor = bits ^ self.previous
+        self.previous = bits
+        if xor == 0:
+            self.writer.write(0, 1)
+            return
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if (
+            self.leading is not None
+            and leading >= self.leading
+            and trailing >= self.trailing
+        ):
+            self.writer.write(0b10, 2)
+            length = 64 - self.leading - self.trailing
+            self.writer.write(xor >> self.trailing, length)
+            return
+        length = 64 - leading - trailing
+        self.writer.write(0b11, 2)
+        self.writer.write(leading, 5)
+        # 64 meaningful bits are stored as 0
+        self.writer.write(length & 0x3F, 6)
+        self.writer.write(xor >> trailing, length)
+        self.leading = leading
+        self.trailing = trailing
+
+    def get_values(self, count):
+        reader = _BitReader(self.writer)
+        values = []
+        bits = _float_bits(0.0)
+        leading = trailing = 0
+        for _ in range(count):
+            if reader.read(1):
+                if reader.read(1):
+                    leading = reader.read(5)
+                    length = reader.read(6) or 64
+                    trailing = 64 - leading - length
+                bits ^= reader.read(64 - leading - trailing) << trailing
+            values.append(_bits_float(bits))
+        return values
+
+    def get_size(self):
+        return self.writer.get_size()
+
+
+class _Chunk:
+    """
+    Compressed block of consecutive points of one container.
+
+    Timestamps (ms) are stored as zig-zag varints of their delta of delta,
+    integer metrics as zig-zag varints of their delta, shifted by one so
+    that 0 marks a value that was not measured, and float metrics
+    with the Gorilla XOR encoding, so a steady series costs about one byte
+    per point for integer columns and one bit for float columns.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.last_delta = 0
+        self.timestamps = bytearray()
+        self.columns = {}
+        for field in CONTAINER_FIELDS:
+            if field in FLOAT_FIELDS:
+                self.columns[field] = _XorEncoder()
+            else:
+                self.columns[field] = bytearray()
+        self.previous = dict.fromkeys(CONTAINER_FIELDS, 0)
+
+    def is_full(self):
+        return self.count >= CHUNK_POINTS
+
+    def add(self, ts, row):
+        if self.first_ts is None:
+            self.first_ts = ts
+            delta = 0
+        else:
+            delta = ts - self.last_ts
+        _append_varint(self.timestamps, _zigzag(delta - self.last_delta))
+        self.last_delta = delta
+        self.last_ts = ts
+
+        for field, sample in zip(CONTAINER_FIELDS, row):
+            if field in FLOAT_FIELDS:
+                self.columns[field].add(sample)
+            else:
+                if sample is None:
+                    _append_varint(self.columns[field], 0)
+                    continue
+                value = int(sample)
+                delta = _zigzag(value - self.previous[field])
+                _append_varint(self.columns[field], delta + 1)
+                self.previous[field] = value
+        self.count += 1
+
+    def get_timestamps(self):
+        timestamps = []
+        ts = self.first_ts
+        delta = 0
+        for index, encoded in enumerate(_read_varints(self.timestamps, self.count)):
+            delta += _unzigzag(encoded)
+            if index > 0:
+                ts += delta
+            timestamps.append(ts)
+        return timestamps
+
+    def get_values(self, field):
+        if field in FLOAT_FIELDS:
+            return self.columns[field].get_values(self.count)
+        values = []
+        value = 0
+        for delta in _read_varints(self.columns[field], self.count):
+            if delta == 0:
+                values.append(None)
+                continue
+            value += _unzigzag(delta - 1)
+            values.append(value)
+        return values
+
+    def get_size(self):
+        size = len(self.timestamps)
+        for field, column in self.columns.items():
+            size += column.get_size() if field in FLOAT_FIELDS else len(column)
+        return size
+
+
+class _ContainerRing:
+    def __init__(self, max_chunks):
+        self.name = ""
+        self.chunks = deque(maxlen=max_chunks)
+
+    def add(self, ts, row):
+        if not self.chunks or self.chunks[-1].is_full():
+            # a full ring drops its oldest chunk
+            self.chunks.append(_Chunk())
+        self.chunks[-1].add(ts, row)
+
+    def get_last_ts(self):
+        return self.chunks[-1].last_ts if self.chunks else None
+
+
+class TimeSeriesStore:
+    """
+    Bounded in-memory history of the container samples.
+
+    Each container owns a ring of compressed chunks sized for retention
+    seconds of samples at the given frequency, older chunks are
+    overwritten. Containers not updated for retention seconds are dropped
+    and at most max_containers are kept, the least recently updated go
+    first. Timestamps are wall clock seconds, stored with ms precision.
+    """
+
+    def __init__(self, retention=300, frequency=1, max_containers=1024):
+        self.retention = int(float(retention) * 1000)
+        max_points = max(1, int(float(retention) * float(frequency)))
+        # one more chunk, the oldest one is partially out of the window
+        self.max_chunks = -(-max_points // CHUNK_POINTS) + 1
+        self.max_containers = max(1, int(max_containers))
+        # container id -> ring, least recently updated first
+        self.containers = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_retention(self):
+        return self.retention / 1000
+
+    def add(self, batch):
+        ts = int(round(float(batch.timestamp) * 1000))
+        with self.lock:
+            for index, container_id in enumerate(batch.container_ids):
+                ring = self.containers.get(container_id)
+                if ring is None:
+                    ring = _ContainerRing(self.max_chunks)
+                    self.containers[container_id] = ring
+                else:
+                    self.containers.move_to_end(container_id)
+                if ring.get_last_ts() is not None and ts <= ring.get_last_ts():
+                    # out of order, the rings are append only
+                    continue
+                ring.name = batch.container_names[index]
+                ring.add(ts, batch.rows[index])
+
+            while self.containers:
+                _, ring = next(iter(self.containers.items()))
+                stale = (
+                    ring.get_last_ts() is None
+                    or ring.get_last_ts() < ts - self.retention
+                )
+                if not stale and len(self.containers) <= self.max_containers:
+                    break
+                self.containers.popitem(last=False)
+
+    def get_containers(self):
+        with self.lock:
+            return {
+                container_id: ring.name for container_id, ring in self.containers.items()
+            }
+
+    def get_metrics(self):
+        return list(CONTAINER_FIELDS)
+
+    def get_size(self):
+        with self.lock:
+            return sum(
+                chunk.get_size()
+                for ring in self.containers.values()
+                for chunk in ring.chunks
+            )
+
+    def query(self, container_id, metric, start=None, end=None):
+        if metric not in CONTAINER_FIELDS:
+            raise KeyError(metric)
+        start_ms = None if start is None else float(start) * 1000
+        end_ms = None if end is None else float(end) * 1000
+        with self.lock:
+            ring = self.containers.get(container_id)
+            chunks = list(ring.chunks) if ring is not None else []
+            points = []
+            for chunk in chunks:
+                if start_ms is not None and chunk.last_ts < start_ms:
+                    continue
+                if end_ms is not None and chunk.first_ts > end_ms:
+                    break
+                timestamps = chunk.get_timestamps()
+                values = chunk.get_values(metric)
+                for ts, value in zip(timestamps, values):
+                    if start_ms is not None and ts < start_ms:
+                        continue
+                    if end_ms is not None and ts > end_ms:
+                        break
+                    points.append((ts / 1000, value))
+        return points